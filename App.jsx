@@ -13,15 +13,15 @@ function App() {
 
   const [flash, setFlash] = useState(false); // for emergency flashing
 
-  // Fetch traffic JSON every 1 second
+  // Subscribe to pushed traffic updates: a full snapshot, then only the changed fields
   useEffect(() => {
-    const interval = setInterval(() => {
-      fetch("http://127.0.0.1:5000/traffic_data")
-        .then((res) => res.json())
-        .then((data) => setTrafficData(data))
-        .catch((err) => console.error(err));
-    }, 1000);
-    return () => clearInterval(interval);
+    const source = new EventSource("http://127.0.0.1:5000/traffic_data/stream");
+    source.addEventListener("snapshot", (event) => setTrafficData(JSON.parse(event.data)));
+    source.addEventListener("update", (event) =>
+      setTrafficData((prev) => ({ ...prev, ...JSON.parse(event.data) }))
+    );
+    source.onerror = (err) => console.error(err);
+    return () => source.close();
   }, []);
 
   // Flash emergency every 0.5s
@@ -5,22 +5,24 @@ export default function TrafficDashboard() {
   const [lanes, setLanes] = useState({ N: 0, S: 0, E: 0, W: 0 });
   const [signal, setSignal] = useState("Loading...");
 
-  // Fetch from backend every 1 sec
+  // Subscribe to pushed updates: a full snapshot, then only the changed fields
   useEffect(() => {
-    const fetchData = async () => {
-      try {
-        const res = await fetch("http://127.0.0.1:5000/traffic");
-        const data = await res.json();
-        setLanes(data.lanes);
-        setSignal(data.signal);
-      } catch (err) {
-        console.error("Backend not reachable:", err);
-      }
-    };
-
-    fetchData(); // initial fetch
-    const interval = setInterval(fetchData, 1000);
-    return () => clearInterval(interval);
+    const source = new EventSource("http://127.0.0.1:5000/traffic/stream");
+
+    source.addEventListener("snapshot", (event) => {
+      const data = JSON.parse(event.data);
+      setLanes(data.lanes);
+      setSignal(data.signal);
+    });
+    source.addEventListener("update", (event) => {
+      const data = JSON.parse(event.data);
+      if (data.lanes) setLanes((prev) => ({ ...prev, ...data.lanes }));
+      if (data.signal !== undefined) setSignal(data.signal);
+    });
+    // EventSource reconnects by itself and gets a fresh snapshot
+    source.onerror = (err) => console.error("Backend not reachable:", err);
+
+    return () => source.close();
   }, []);
 
   // Lane labels + counts
@@ -1,69 +1,144 @@
 import cv2
+import time
+import queue
+import threading
+from urllib.parse import quote
 import numpy as np
 import tkinter as tk
 from PIL import Image, ImageTk
-from ultralytics import YOLO
+
+from tracker import Tracker
+from detector_backend import load_model, boxes_to_numpy, class_mask, class_names, letterbox, undo_letterbox, nms
 
 # === CONFIG ===
-NORTH_VIDEO = r"C:\Users\rajiv\Downloads\video3.mp4"
-SOUTH_VIDEO = r"C:\Users\rajiv\Downloads\video2.mp4"
+# One entry per camera. source: video file, camera index or stream URL. roi: polygon in
+# DISPLAY_SIZE pixels whose vehicles belong to this approach (None for the whole frame).
+# phase_group: lanes that get green together, e.g. "NS" for opposing through lanes.
+LANES = [
+    {"name": "North", "source": r"C:\Users\rajiv\Downloads\video3.mp4", "roi": None,
+     "phase_group": "North"},
+    {"name": "South", "source": r"C:\Users\rajiv\Downloads\video2.mp4", "roi": None,
+     "phase_group": "South"},
+]
+LANES_PER_ROW = 4
 DISPLAY_SIZE = (420, 320)
-DETECT_INTERVAL_MS = 100
+INFERENCE_SIZE = 640       # model input side in pixels, a multiple of 32; frames are letterboxed to it
+TILED_INFERENCE = False    # also detect on overlapping full-resolution tiles, for distant queued vehicles
+TILE_SIZE = 640            # tile side in source-frame pixels
+TILE_OVERLAP = 0.2         # fraction of a tile shared with its neighbour
+TILE_NMS_IOU = 0.5         # boxes found in several tiles are merged above this IoU
+TILE_FRAGMENT_COVER = 0.5  # a box cut by a tile edge is dropped when this fraction of it lies inside a whole box
+TRACK_INTERVAL_MS = 100   # tracker tick; tracks are predicted forward every tick
+DETECT_EVERY_N = 5        # run the YOLO models on every Nth tick only
+QUEUE_SPEED_PX = 0.5      # tracks slower than this many pixels per tick count as queued
+MOTION_SIZE = (80, 60)     # grey thumbnail compared to decide whether a lane needs re-detection
+MOTION_PIXEL_DELTA = 25    # grey-level change that counts a thumbnail pixel as moved
+MOTION_MIN_FRACTION = 0.01 # fraction of moved pixels that triggers detection
+MAX_STALENESS_S = 5.0      # re-detect a lane at least this often even if nothing moved
+MAX_BATCH_LANES = 4        # most lanes sent through the models in one tick; the longest-waiting go first
+EMERGENCY_CASCADE = True   # run the emergency model on vehicle crops instead of whole frames
+EMERGENCY_CROP_SIZE = 128  # crops are letterboxed to this square before the emergency model
+MIN_CONFIDENCE = 0.25      # detections below this confidence are dropped
+ANNOTATE_FRAMES = True     # draw boxes and labels on the displayed frames
+DISPLAY_INTERVAL_MS = 40   # video refresh (25 fps), independent of tracking and detection
+STREAM_URL = "http://127.0.0.1:5000/frames"  # traffic_server.py frame ingest; None disables streaming
+STREAM_FPS = 10            # annotated frames JPEG-encoded and sent per lane per second
+STREAM_JPEG_QUALITY = 70   # 0-100; lower is smaller and cheaper to send
+STREAM_RETRY_S = 5.0       # wait this long before retrying when the server is unreachable
 MIN_GREEN = 8
 MAX_GREEN = 15
 
 VEHICLE_LABELS = {"car", "truck", "bus", "motorbike", "motorcycle", "bicycle", "van"}
 EMERGENCY_LABELS = {"ambulance", "firetruck", "fire truck", "police", "police car", "policecar"}
 
+# === DETECTOR BACKEND ===
+DETECTOR_BACKEND = "torch"  # "torch" (ultralytics), "onnx" (ONNX Runtime) or "openvino"
+DETECTOR_INT8 = False       # ONNX backends only: use the INT8-quantized export
+CALIBRATION_DIR = None      # frames from our own footage used to calibrate the INT8 export
+INFERENCE_THREADS = None    # CPU threads per model; None lets the runtime decide
+
 # === YOLO LOCAL MODEL PATHS ===
 vehicle_model_path = r"C:\Users\rajiv\Documents\traffic-dashboard\yolov8m.pt"
 emergency_model_path = r"C:\Users\rajiv\Documents\traffic-dashboard\yolov8n.pt"
 
 # === LOAD MODELS ===
-vehicle_model = YOLO(vehicle_model_path)
-emergency_model = YOLO(emergency_model_path)
-
-# === VIDEO CAPTURES ===
-north_cap = cv2.VideoCapture(NORTH_VIDEO)
-south_cap = cv2.VideoCapture(SOUTH_VIDEO)
+vehicle_model = load_model(vehicle_model_path, DETECTOR_BACKEND, DETECTOR_INT8, CALIBRATION_DIR, INFERENCE_THREADS)
+emergency_model = load_model(emergency_model_path, DETECTOR_BACKEND, DETECTOR_INT8, CALIBRATION_DIR, INFERENCE_THREADS)
+
+# Label filters as lookups by class id, so results are filtered as whole arrays
+VEHICLE_MASK, VEHICLE_NAMES = class_mask(vehicle_model.names, VEHICLE_LABELS), class_names(vehicle_model.names)
+EMERGENCY_MASK, EMERGENCY_NAMES = class_mask(emergency_model.names, EMERGENCY_LABELS), class_names(emergency_model.names)
+
+# === LANES ===
+class Lane:
+    """One camera: its config, capture, tracker and latest per-lane results"""
+    def __init__(self, config):
+        self.name = config["name"]
+        self.phase_group = config["phase_group"]
+        self.cap = cv2.VideoCapture(config["source"])
+        self.roi_mask = None
+        self.motion_mask = None
+        self.roi = config.get("roi")
+        if self.roi:
+            polygon = np.array(self.roi, dtype=np.int32)
+            self.roi_mask = np.zeros((DISPLAY_SIZE[1], DISPLAY_SIZE[0]), dtype=np.uint8)
+            cv2.fillPoly(self.roi_mask, [polygon], 1)
+            self.motion_mask = cv2.resize(self.roi_mask, MOTION_SIZE, interpolation=cv2.INTER_NEAREST) > 0
+        self.capture_queue = queue.Queue(maxsize=1)
+        self.latest = None           # (frame number, frame) straight from the capture thread
+        self.overlay = None          # latest track and emergency boxes from the inference worker
+        self.shown = (None, None)    # frame number and overlay last drawn
+        # The display converts into this buffer, which the PIL image shares, then pastes it
+        # into the lane's one PhotoImage; nothing is allocated per frame
+        self.rgba = np.zeros((DISPLAY_SIZE[1], DISPLAY_SIZE[0], 4), dtype=np.uint8)
+        self.pil_image = Image.frombuffer("RGBA", DISPLAY_SIZE, self.rgba, "raw", "RGBA", 0, 1)
+        # The stream thread annotates its own copy, so it never races the display
+        self.stream_rgba = np.zeros_like(self.rgba)
+        self.stream_bgr = np.zeros((DISPLAY_SIZE[1], DISPLAY_SIZE[0], 3), dtype=np.uint8)
+        self.streamed = (None, None)  # frame number and overlay last sent to the server
+        self.stream_retry_at = 0.0    # time.monotonic() before which a failing lane isn't resent
+        self.stream_url = f"{STREAM_URL}/{quote(self.name, safe='')}" if STREAM_URL else None
+        self.tracker = Tracker(queue_speed=QUEUE_SPEED_PX)
+        self.emergencies = (np.zeros((0, 4), dtype=int), [])
+        self.reference = None        # motion thumbnail at the last detection
+        self.last_detected = 0.0     # time.monotonic() of the last detection
+        self.last_detect_tick = -DETECT_EVERY_N
+        self.next_check_tick = 0
+        # Published under state_lock for the display and signal logic
+        self.count = 0
+        self.queue_length = 0
+        self.seen = 0
+        self.emergency = False
+
+lanes = [Lane(config) for config in LANES]
+PHASE_GROUPS = list(dict.fromkeys(lane.phase_group for lane in lanes))
 
 # === GUI INIT ===
 root = tk.Tk()
 root.title("Smart Traffic — Live Detection")
 root.configure(bg="black")
 
-# Top labels
+# Top label
 top_frame = tk.Frame(root, bg="black")
 top_frame.pack()
-north_label_text = tk.Label(top_frame, text="North: 0", fg="white", bg="black", font=("Arial", 14))
-north_label_text.grid(row=0, column=0, padx=20)
 timer_label = tk.Label(top_frame, text="Timer: 0s", fg="yellow", bg="black", font=("Arial", 16))
-timer_label.grid(row=0, column=1, padx=40)
-south_label_text = tk.Label(top_frame, text="South: 0", fg="white", bg="black", font=("Arial", 14))
-south_label_text.grid(row=0, column=2, padx=20)
-
-# Traffic lights
-light_frame = tk.Frame(root, bg="black")
-light_frame.pack(pady=6)
-north_canvas = tk.Canvas(light_frame, width=80, height=200, bg="black", highlightthickness=0)
-north_canvas.grid(row=0, column=0, padx=40)
-south_canvas = tk.Canvas(light_frame, width=80, height=200, bg="black", highlightthickness=0)
-south_canvas.grid(row=0, column=2, padx=40)
-
-# Video frames
-video_frame = tk.Frame(root, bg="black")
-video_frame.pack(pady=6)
-north_video_label = tk.Label(video_frame, bg="black")
-north_video_label.grid(row=0, column=0, padx=10)
-south_video_label = tk.Label(video_frame, bg="black")
-south_video_label.grid(row=0, column=1, padx=10)
+timer_label.grid(row=0, column=0, padx=40)
+
+# Per lane: count label, traffic light and video, LANES_PER_ROW lanes to a row
+lanes_frame = tk.Frame(root, bg="black")
+lanes_frame.pack(pady=6)
+for i, lane in enumerate(lanes):
+    row, column = 3 * (i // LANES_PER_ROW), i % LANES_PER_ROW
+    lane.label_text = tk.Label(lanes_frame, text=f"{lane.name}: 0", fg="white", bg="black", font=("Arial", 14))
+    lane.label_text.grid(row=row, column=column, padx=10)
+    lane.canvas = tk.Canvas(lanes_frame, width=80, height=200, bg="black", highlightthickness=0)
+    lane.canvas.grid(row=row + 1, column=column, pady=6)
+    lane.photo = ImageTk.PhotoImage("RGBA", DISPLAY_SIZE)
+    lane.video_label = tk.Label(lanes_frame, image=lane.photo, bg="black")
+    lane.video_label.grid(row=row + 2, column=column, padx=10, pady=6)
 
 # Traffic state
-north_count = 0
-south_count = 0
-north_emergency = False
-south_emergency = False
-green_lane = "North"
+green_group = PHASE_GROUPS[0]
 timer = MIN_GREEN
 phase = "green"
 
@@ -76,96 +151,406 @@ def draw_signal(canvas, color):
         fill = col if col == color else "grey"
         canvas.create_oval(10, y_positions[i], 70, y_positions[i]+40, fill=fill)
 
-def detect_objects(frame):
-    vehicle_count = 0
-    emergency_present = False
-
-    res_v = vehicle_model(frame)[0]
-    for box in res_v.boxes:
-        cls_name = vehicle_model.names[int(box.cls[0])].lower()
-        x1, y1, x2, y2 = [int(i) for i in box.xyxy[0]]
-        if cls_name in VEHICLE_LABELS:
-            vehicle_count += 1
-            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-            cv2.putText(frame, cls_name, (x1, y1-5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-
-    res_e = emergency_model(frame)[0]
-    for box in res_e.boxes:
-        cls_name = emergency_model.names[int(box.cls[0])].lower()
-        x1, y1, x2, y2 = [int(i) for i in box.xyxy[0]]
-        if cls_name in EMERGENCY_LABELS:
-            emergency_present = True
-            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 3)
-            cv2.putText(frame, cls_name, (x1, y1-5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-
-    return frame, vehicle_count, emergency_present
+def filter_boxes(res, mask):
+    xyxy, conf, cls = boxes_to_numpy(res.boxes)
+    keep = mask[cls] & (conf >= MIN_CONFIDENCE)
+    return xyxy[keep], conf[keep], cls[keep]
+
+def extract_detections(res, mask, names):
+    xyxy, _, cls = filter_boxes(res, mask)
+    return xyxy.astype(int), names[cls].tolist()
+
+def draw_boxes(frame, boxes, names, box_color, text_color, thickness):
+    if not ANNOTATE_FRAMES:
+        return
+    for (x1, y1, x2, y2), name in zip(boxes, names):
+        cv2.rectangle(frame, (x1, y1), (x2, y2), box_color, thickness)
+        cv2.putText(frame, name, (x1, y1-5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, text_color, 2)
+
+def detect_emergency_crops(frames, vehicles):
+    # Emergency labels can only match vehicles, so only look inside the vehicle boxes,
+    # all lanes' crops in one batch. A vehicle box is an emergency if anything matches in it.
+    crops, owners = [], []
+    for i, (frame, (boxes, _)) in enumerate(zip(frames, vehicles)):
+        h, w = frame.shape[:2]
+        for box in boxes:
+            x1, y1 = max(box[0], 0), max(box[1], 0)
+            x2, y2 = min(box[2], w), min(box[3], h)
+            if x2 - x1 < 2 or y2 - y1 < 2:
+                continue
+            # Letterboxed rather than stretched: a bus squashed to a square isn't what the model saw in training
+            crops.append(letterbox(frame[y1:y2, x1:x2], EMERGENCY_CROP_SIZE)[0])
+            owners.append((i, box))
+
+    emergencies = [([], []) for _ in frames]
+    if crops:
+        for (i, box), res in zip(owners, emergency_model(crops, imgsz=EMERGENCY_CROP_SIZE)):
+            _, names = extract_detections(res, EMERGENCY_MASK, EMERGENCY_NAMES)
+            if names:
+                emergencies[i][0].append(box)
+                emergencies[i][1].append(names[0])
+    return [(np.array(boxes, dtype=int).reshape(-1, 4), names) for boxes, names in emergencies]
+
+def letterbox_batch(frames):
+    # Letterbox once to INFERENCE_SIZE, so the model input doesn't depend on the source or display size
+    inputs, transforms = [], []
+    for frame in frames:
+        image, scale, pad = letterbox(frame, INFERENCE_SIZE)
+        inputs.append(image)
+        transforms.append((scale, pad, frame.shape[:2]))
+    return inputs, transforms
+
+def run_letterboxed(model, frames, mask):
+    # Returns (xyxy, conf, cls) per frame in source-frame pixels
+    inputs, transforms = letterbox_batch(frames)
+    detections = []
+    for res, (scale, pad, shape) in zip(model(inputs, imgsz=INFERENCE_SIZE), transforms):
+        xyxy, conf, cls = filter_boxes(res, mask)
+        detections.append((undo_letterbox(xyxy, scale, pad, shape), conf, cls))
+    return detections
+
+def tile_origins(length):
+    if length <= TILE_SIZE:
+        return [0]
+    step = max(1, int(TILE_SIZE * (1 - TILE_OVERLAP)))
+    return list(range(0, length - TILE_SIZE, step)) + [length - TILE_SIZE]
+
+def merge_tile_fragments(xyxy, cls, clipped):
+    # A vehicle cut by a tile edge leaves a fragment that barely overlaps the whole box by IoU.
+    # Drop cut boxes that mostly lie inside another box of the same class, whole boxes first.
+    x1 = np.maximum(xyxy[:, None, 0], xyxy[None, :, 0])
+    y1 = np.maximum(xyxy[:, None, 1], xyxy[None, :, 1])
+    x2 = np.minimum(xyxy[:, None, 2], xyxy[None, :, 2])
+    y2 = np.minimum(xyxy[:, None, 3], xyxy[None, :, 3])
+    area = (xyxy[:, 2] - xyxy[:, 0]) * (xyxy[:, 3] - xyxy[:, 1])
+    covered = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None) / np.maximum(area[:, None], 1e-9)
+    covered *= cls[:, None] == cls[None, :]
+    kept = []
+    for i in np.lexsort((-area, clipped)):
+        if clipped[i] and kept and covered[i, kept].max() > TILE_FRAGMENT_COVER:
+            continue
+        kept.append(i)
+    return np.array(kept, dtype=int)
+
+def run_tiled(model, frames, mask):
+    # Each frame is seen whole (for vehicles larger than a tile) and as overlapping tiles at
+    # source resolution, every view of every frame in one batch; duplicates are merged by NMS
+    views, owners = [], []
+    for i, frame in enumerate(frames):
+        h, w = frame.shape[:2]
+        tiles = [(x, y) for y in tile_origins(h) for x in tile_origins(w)]
+        views.append(frame)
+        owners.append((i, 0, 0))
+        if len(tiles) > 1:
+            for x, y in tiles:
+                views.append(frame[y:y + TILE_SIZE, x:x + TILE_SIZE])
+                owners.append((i, x, y))
+
+    parts = [[] for _ in frames]
+    for (i, x, y), view, (xyxy, conf, cls) in zip(owners, views, run_letterboxed(model, views, mask)):
+        # Boxes touching a tile edge that is inside the frame are probably cut off
+        h, w = frames[i].shape[:2]
+        vh, vw = view.shape[:2]
+        clipped = (((xyxy[:, 0] <= 1) & (x > 0)) | ((xyxy[:, 1] <= 1) & (y > 0)) |
+                   ((xyxy[:, 2] >= vw - 1) & (x + vw < w)) | ((xyxy[:, 3] >= vh - 1) & (y + vh < h)))
+        parts[i].append((xyxy + (x, y, x, y), conf, cls, clipped))
+    detections = []
+    for frame_parts in parts:
+        xyxy, conf, cls, clipped = (np.concatenate(arrays) for arrays in zip(*frame_parts))
+        keep = nms(xyxy, conf, cls, TILE_NMS_IOU)
+        keep = keep[merge_tile_fragments(xyxy[keep], cls[keep], clipped[keep])]
+        detections.append((xyxy[keep], conf[keep], cls[keep]))
+    return detections
+
+def to_display(xyxy, shape):
+    h, w = shape[:2]
+    sx, sy = DISPLAY_SIZE[0] / w, DISPLAY_SIZE[1] / h
+    return (xyxy * (sx, sy, sx, sy)).astype(int)
+
+def in_roi(boxes, roi_mask):
+    # Boxes whose bottom-centre, where the vehicle meets the road, lies inside the ROI
+    if roi_mask is None or not len(boxes):
+        return np.ones(len(boxes), dtype=bool)
+    h, w = roi_mask.shape
+    x = ((boxes[:, 0] + boxes[:, 2]) // 2).clip(0, w - 1)
+    y = (boxes[:, 3] - 1).clip(0, h - 1)
+    return roi_mask[y, x] > 0
+
+def run_models(frames, roi_masks=None):
+    # One forward pass per model for every lane's frame, then split back out per lane.
+    # Frames are full source resolution; the returned boxes are in DISPLAY_SIZE pixels.
+    # Returns ((vehicle_boxes, vehicle_names), (emergency_boxes, emergency_names)) per frame.
+    roi_masks = roi_masks or [None] * len(frames)
+    run = run_tiled if TILED_INFERENCE else run_letterboxed
+    vehicles, source_vehicles = [], []
+    for frame, roi_mask, (xyxy, _, cls) in zip(frames, roi_masks, run(vehicle_model, frames, VEHICLE_MASK)):
+        display = to_display(xyxy, frame.shape)
+        inside = in_roi(display, roi_mask)
+        names = VEHICLE_NAMES[cls[inside]].tolist()
+        vehicles.append((display[inside], names))
+        source_vehicles.append((xyxy[inside].astype(int), names))
+
+    if EMERGENCY_CASCADE:
+        # Crops come from the source frames, so they keep full resolution
+        emergencies = [(to_display(boxes, frame.shape), names) for frame, (boxes, names)
+                       in zip(frames, detect_emergency_crops(frames, source_vehicles))]
+    else:
+        emergencies = []
+        for frame, roi_mask, (xyxy, _, cls) in zip(frames, roi_masks, run_letterboxed(emergency_model, frames, EMERGENCY_MASK)):
+            display = to_display(xyxy, frame.shape)
+            inside = in_roi(display, roi_mask)
+            emergencies.append((display[inside], EMERGENCY_NAMES[cls[inside]].tolist()))
+    return list(zip(vehicles, emergencies))
+
+def motion_signature(frame):
+    grey = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(grey, MOTION_SIZE, interpolation=cv2.INTER_AREA)
+    return cv2.GaussianBlur(small, (5, 5), 0)
+
+def scene_changed(reference, signature, mask=None):
+    if reference is None:
+        return True
+    moved = cv2.absdiff(reference, signature) > MOTION_PIXEL_DELTA
+    if mask is not None:
+        return np.count_nonzero(moved & mask) >= MOTION_MIN_FRACTION * np.count_nonzero(mask)
+    return np.count_nonzero(moved) >= MOTION_MIN_FRACTION * moved.size
+
+def phase_demand():
+    # Vehicles and emergencies per phase group; call with state_lock held
+    demand = {group: 0 for group in PHASE_GROUPS}
+    emergency_groups = set()
+    for lane in lanes:
+        demand[lane.phase_group] += lane.count
+        if lane.emergency:
+            emergency_groups.add(lane.phase_group)
+    return demand, emergency_groups
+
+def choose_green_group():
+    # An emergency wins; otherwise the busiest group, ties going to the first configured
+    demand, emergency_groups = phase_demand()
+    candidates = [group for group in PHASE_GROUPS if group in emergency_groups] or PHASE_GROUPS
+    chosen = max(candidates, key=lambda group: demand[group])
+    runner_up = max((demand[group] for group in PHASE_GROUPS if group != chosen), default=0)
+    return chosen, abs(demand[chosen] - runner_up)
 
 # === PREPROCESS FIRST FRAME ===
-ret_n, f_n = north_cap.read()
-ret_s, f_s = south_cap.read()
-if ret_n and ret_s:
-    f_n = cv2.resize(f_n, DISPLAY_SIZE)
-    f_s = cv2.resize(f_s, DISPLAY_SIZE)
-    f_n, north_count, north_emergency = detect_objects(f_n)
-    f_s, south_count, south_emergency = detect_objects(f_s)
-
-    # Display first frame
-    im_n = ImageTk.PhotoImage(image=Image.fromarray(cv2.cvtColor(f_n, cv2.COLOR_BGR2RGB)))
-    im_s = ImageTk.PhotoImage(image=Image.fromarray(cv2.cvtColor(f_s, cv2.COLOR_BGR2RGB)))
-    north_video_label.imgtk = im_n
-    north_video_label.configure(image=im_n)
-    south_video_label.imgtk = im_s
-    south_video_label.configure(image=im_s)
-
-    north_label_text.config(text=f"North: {north_count}")
-    south_label_text.config(text=f"South: {south_count}")
-
-    # Decide initial green lane
-    green_lane = "North" if north_count >= south_count else "South"
-
-# === FRAME UPDATE LOOP ===
-def update_frames():
-    global north_count, south_count, north_emergency, south_emergency
-
-    ret_n, f_n = north_cap.read()
-    ret_s, f_s = south_cap.read()
-
-    if not ret_n:
-        north_cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-        ret_n, f_n = north_cap.read()
-    if not ret_s:
-        south_cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-        ret_s, f_s = south_cap.read()
-
-    f_n = cv2.resize(f_n, DISPLAY_SIZE)
-    f_s = cv2.resize(f_s, DISPLAY_SIZE)
-
-    f_n, north_count, north_emergency = detect_objects(f_n)
-    f_s, south_count, south_emergency = detect_objects(f_s)
-
-    im_n = ImageTk.PhotoImage(image=Image.fromarray(cv2.cvtColor(f_n, cv2.COLOR_BGR2RGB)))
-    im_s = ImageTk.PhotoImage(image=Image.fromarray(cv2.cvtColor(f_s, cv2.COLOR_BGR2RGB)))
-    north_video_label.imgtk = im_n
-    north_video_label.configure(image=im_n)
-    south_video_label.imgtk = im_s
-    south_video_label.configure(image=im_s)
-
-    north_label_text.config(text=f"North: {north_count}")
-    south_label_text.config(text=f"South: {south_count}")
-
-    root.after(DETECT_INTERVAL_MS, update_frames)
+first_frames = []
+for lane in lanes:
+    ret, frame = lane.cap.read()
+    if ret:
+        first_frames.append((lane, frame))
+if first_frames:
+    results = run_models([frame for _, frame in first_frames], [lane.roi_mask for lane, _ in first_frames])
+    for (lane, _), (vehicles, emergencies) in zip(first_frames, results):
+        lane.count, lane.emergency = len(vehicles[0]), len(emergencies[0]) > 0
+
+    # Decide initial green group
+    green_group, _ = choose_green_group()
+
+# === PIPELINE ===
+# Capture threads -> inference worker -> Tk display, linked by one-slot queues.
+# A stage that falls behind only ever sees the newest frame; stale ones are dropped.
+stop_event = threading.Event()
+state_lock = threading.Lock()
+
+def put_latest(q, item):
+    # Each queue has a single producer, so after emptying it the put can't block
+    try:
+        q.get_nowait()
+    except queue.Empty:
+        pass
+    q.put_nowait(item)
+
+def capture_loop(lane):
+    # Video files are paced to their own frame rate; live cameras block in read()
+    cap = lane.cap
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_period = 1 / fps if fps and fps > 0 else 0
+    next_frame = time.monotonic()
+    frame_number = 0
+    while not stop_event.is_set():
+        ret, frame = cap.read()
+        if not ret:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = cap.read()
+            if not ret:
+                time.sleep(0.5)
+                continue
+        # The worker gets the source frame for detection and the display-sized one for motion
+        display_frame = cv2.resize(frame, DISPLAY_SIZE)
+        frame_number += 1
+        lane.latest = (frame_number, display_frame)
+        put_latest(lane.capture_queue, (frame, display_frame))
+
+        next_frame += frame_period
+        delay = next_frame - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_frame = time.monotonic()
+
+def select_for_detection(fresh, tick, started):
+    # Lanes whose detection is due and whose scene moved (or went stale), longest-waiting
+    # first and at most MAX_BATCH_LANES, so every approach gets served however many there are.
+    # Lanes with unconfirmed tracks stay due: a vehicle that stopped right after its first
+    # detection needs a second one to be counted, and a still scene would never trigger it.
+    candidates = sorted((lane for lane in fresh if tick >= lane.next_check_tick),
+                        key=lambda lane: lane.last_detect_tick)
+    due = []
+    for lane in candidates:
+        if len(due) == MAX_BATCH_LANES:
+            break
+        signature = motion_signature(fresh[lane][1])
+        lane.next_check_tick = tick + DETECT_EVERY_N
+        if (lane.tracker.tentative()
+                or scene_changed(lane.reference, signature, lane.motion_mask)
+                or started - lane.last_detected > MAX_STALENESS_S):
+            due.append((lane, signature))
+        else:
+            # Nothing moved since the last detection, so neither did the vehicles: hold the
+            # tracks where they are instead of coasting on stale velocities until re-detection
+            lane.tracker.freeze()
+    return due
+
+def inference_loop():
+    # Each lane is detected at most every DETECT_EVERY_N ticks; in between, tracks are carried
+    # forward by their Kalman filters, so counts come from tracks rather than one frame's boxes.
+    # A lane with no new frame this tick keeps its tracks and is neither detected nor redrawn.
+    tick = 0
+    while not stop_event.is_set():
+        started = time.monotonic()
+        fresh = {}
+        for lane in lanes:
+            try:
+                fresh[lane] = lane.capture_queue.get_nowait()
+            except queue.Empty:
+                pass
+        if not fresh:
+            stop_event.wait(TRACK_INTERVAL_MS / 1000)
+            continue
+
+        for lane in lanes:
+            lane.tracker.predict()
+        due = select_for_detection(fresh, tick, started)
+        if due:
+            results = run_models([fresh[lane][0] for lane, _ in due], [lane.roi_mask for lane, _ in due])
+            for (lane, signature), (vehicles, emergencies) in zip(due, results):
+                lane.tracker.update(*vehicles)
+                lane.emergencies = emergencies
+                lane.reference = signature
+                lane.last_detected = started
+                lane.last_detect_tick = tick
+        tick += 1
+
+        # Frames are shared with the display, so only box positions are published, never drawn here
+        for lane in lanes:
+            tracker = lane.tracker
+            confirmed = tracker.confirmed()
+            names = [f"#{track_id} {label}" for track_id, label, c
+                     in zip(tracker.ids, tracker.labels, confirmed) if c]
+            lane.overlay = (tracker.boxes()[confirmed].astype(int), names, lane.emergencies)
+
+        with state_lock:
+            for lane in lanes:
+                lane.count = lane.tracker.active_count()
+                lane.queue_length = lane.tracker.queue_length()
+                lane.seen = lane.tracker.unique_count
+                lane.emergency = len(lane.emergencies[1]) > 0
+
+        # Ticks run at most every TRACK_INTERVAL_MS; when detection is slower they run back to back
+        delay = TRACK_INTERVAL_MS / 1000 - (time.monotonic() - started)
+        if delay > 0:
+            stop_event.wait(delay)
+
+# === DISPLAY LOOP ===
+def draw_overlay(image, overlay, roi):
+    # image is RGBA, so colours are RGB plus an opaque alpha
+    if overlay is None:
+        return
+    track_boxes, track_names, (emergency_boxes, emergency_names) = overlay
+    draw_boxes(image, track_boxes, track_names, (0, 255, 0, 255), (255, 255, 255, 255), 2)
+    draw_boxes(image, emergency_boxes, emergency_names, (255, 0, 0, 255), (255, 0, 0, 255), 3)
+    if ANNOTATE_FRAMES and roi:
+        cv2.polylines(image, [np.array(roi, dtype=np.int32)], True, (0, 255, 255, 255), 1)
+
+def update_display():
+    # Tk widgets are only touched here, on the main thread. Each lane shows its newest
+    # captured frame with the newest tracks, at the display rate, whatever detection is doing.
+    for lane in lanes:
+        latest, overlay = lane.latest, lane.overlay
+        if latest is None or (latest[0] == lane.shown[0] and overlay is lane.shown[1]):
+            continue
+        cv2.cvtColor(latest[1], cv2.COLOR_BGR2RGBA, dst=lane.rgba)
+        draw_overlay(lane.rgba, overlay, lane.roi)
+        lane.photo.paste(lane.pil_image)
+        lane.shown = (latest[0], overlay)
+
+    with state_lock:
+        for lane in lanes:
+            text = f"{lane.name}: {lane.count} (queue {lane.queue_length}, seen {lane.seen})"
+            if lane.label_text.cget("text") != text:
+                lane.label_text.config(text=text)
+
+    root.after(DISPLAY_INTERVAL_MS, update_display)
+
+# === VIDEO STREAM ===
+def encode_lane(lane, encode_params):
+    # ((frame number, overlay), JPEG bytes) of the lane's newest annotated frame,
+    # or None if nothing changed since the last one the server accepted
+    latest, overlay = lane.latest, lane.overlay
+    if latest is None or (latest[0] == lane.streamed[0] and overlay is lane.streamed[1]):
+        return None
+    cv2.cvtColor(latest[1], cv2.COLOR_BGR2RGBA, dst=lane.stream_rgba)
+    draw_overlay(lane.stream_rgba, overlay, lane.roi)
+    cv2.cvtColor(lane.stream_rgba, cv2.COLOR_RGBA2BGR, dst=lane.stream_bgr)
+    ok, jpeg = cv2.imencode(".jpg", lane.stream_bgr, encode_params)
+    return ((latest[0], overlay), jpeg.tobytes()) if ok else None
+
+def stream_loop():
+    # Each frame is encoded once here, at STREAM_FPS, and posted to traffic_server.py, which
+    # sends those same bytes to every /video_feed viewer; viewers never cost an encode here.
+    # Imported here so requests is only needed when streaming is on
+    import requests
+    session = requests.Session()
+    encode_params = [cv2.IMWRITE_JPEG_QUALITY, STREAM_JPEG_QUALITY]
+    period = 1 / STREAM_FPS
+    next_send = time.monotonic()
+    while not stop_event.is_set():
+        for lane in lanes:
+            if time.monotonic() < lane.stream_retry_at:
+                continue
+            encoded = encode_lane(lane, encode_params)
+            if encoded is None:
+                continue
+            shown, jpeg = encoded
+            try:
+                session.post(lane.stream_url, data=jpeg, headers={"Content-Type": "image/jpeg"},
+                             timeout=2).raise_for_status()
+            except requests.RequestException:
+                # Streaming is optional; detection and the signal carry on without the server.
+                # Only this lane backs off, and its frame stays unsent so the retry picks it up.
+                lane.stream_retry_at = time.monotonic() + STREAM_RETRY_S
+                continue
+            lane.streamed = shown
+
+        next_send += period
+        delay = next_send - time.monotonic()
+        if delay > 0:
+            stop_event.wait(delay)
+        else:
+            next_send = time.monotonic()
 
 # === TIMER / SIGNAL LOGIC ===
 def update_timer():
-    global timer, phase, green_lane
+    global timer, phase, green_group, next_timer_tick
     timer_label.config(text=f"Timer: {timer}s")
 
-    if phase == "green":
-        draw_signal(north_canvas, "green" if green_lane=="North" else "red")
-        draw_signal(south_canvas, "green" if green_lane=="South" else "red")
-    else:
-        draw_signal(north_canvas, "yellow")
-        draw_signal(south_canvas, "yellow")
+    # The green group's lights go green then yellow; every other group stays red
+    for lane in lanes:
+        if lane.phase_group != green_group:
+            draw_signal(lane.canvas, "red")
+        else:
+            draw_signal(lane.canvas, "green" if phase == "green" else "yellow")
 
     timer -= 1
     if timer <= 0:
@@ -174,19 +559,35 @@ def update_timer():
             timer = 3
         else:
             phase = "green"
-            if north_emergency:
-                green_lane = "North"
-            elif south_emergency:
-                green_lane = "South"
-            else:
-                green_lane = "North" if north_count >= south_count else "South"
-            diff = abs(north_count - south_count)
+            with state_lock:
+                green_group, diff = choose_green_group()
             extra = min(10, (diff//5)*2)
             timer = MIN_GREEN + extra
 
-    root.after(1000, update_timer)
+    # Schedule against a fixed deadline so late callbacks don't accumulate drift
+    next_timer_tick += 1
+    root.after(max(0, int((next_timer_tick - time.monotonic()) * 1000)), update_timer)
+
+def on_close():
+    stop_event.set()
+    root.destroy()
 
 # === START LOOPS ===
-update_frames()
+threads = [threading.Thread(target=capture_loop, args=(lane,), daemon=True) for lane in lanes]
+threads.append(threading.Thread(target=inference_loop, daemon=True))
+if STREAM_URL:
+    threads.append(threading.Thread(target=stream_loop, daemon=True))
+for thread in threads:
+    thread.start()
+
+root.protocol("WM_DELETE_WINDOW", on_close)
+next_timer_tick = time.monotonic()
+update_display()
 update_timer()
 root.mainloop()
+
+stop_event.set()
+for thread in threads:
+    thread.join(timeout=2)
+for lane in lanes:
+    lane.cap.release()
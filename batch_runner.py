@@ -0,0 +1,87 @@
+import os
+import csv
+import time
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Workers never open a window or play sound
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import final2
+
+# Scenario parameters, in the order they appear in the results table
+SCENARIO_FIELDS = ["spawn_interval", "green_interval", "grid_size", "emergency_interval", "seed"]
+METRIC_FIELDS = ["vehicles_cleared", "mean_delay_s", "mean_emergency_clearance_s",
+                 "emergency_activations", "total_spawned", "vehicles", "wall_time_s"]
+
+
+def run_scenario(scenario, duration_s, backend):
+    """Run one headless simulation and return its parameters plus metrics"""
+    road_x_positions, road_y_positions, world_width, world_height = final2.make_road_grid(
+        scenario["grid_size"], scenario["grid_size"])
+    start = time.perf_counter()
+    stats = final2.run_headless(
+        duration_s,
+        seed=scenario["seed"],
+        regular_spawn_interval=scenario["spawn_interval"],
+        emergency_spawn_interval=scenario["emergency_interval"] or None,
+        green_interval=scenario["green_interval"],
+        road_x_positions=road_x_positions,
+        road_y_positions=road_y_positions,
+        world_width=world_width,
+        world_height=world_height,
+        fleet_backend=backend,
+    )
+    stats["wall_time_s"] = round(time.perf_counter() - start, 2)
+    return {**scenario, **{field: stats[field] for field in METRIC_FIELDS}}
+
+
+def scenario_grid(args):
+    for values in itertools.product(args.spawn_intervals, args.green_intervals, args.grid_sizes,
+                                    args.emergency_intervals, args.seeds):
+        yield dict(zip(SCENARIO_FIELDS, values))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a grid of headless final2.py scenarios in parallel")
+    parser.add_argument("--spawn-intervals", type=int, nargs="+", default=[3000],
+                        help="milliseconds between regular vehicle spawns")
+    parser.add_argument("--green-intervals", type=int, nargs="+", default=[4000],
+                        help="TrafficLight green change_interval in milliseconds")
+    parser.add_argument("--grid-sizes", type=int, nargs="+", default=[4],
+                        help="intersections per side of the road grid")
+    parser.add_argument("--emergency-intervals", type=int, nargs="+", default=[0],
+                        help="milliseconds between emergency spawns, 0 for none")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0])
+    parser.add_argument("--duration", type=float, default=3600, help="simulated seconds per run")
+    parser.add_argument("--backend", choices=["objects", "numpy"], default="numpy")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--output", default="batch_results.csv")
+    args = parser.parse_args()
+
+    scenarios = list(scenario_grid(args))
+    print(f"Running {len(scenarios)} scenarios of {args.duration:g} simulated seconds")
+
+    results = []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(run_scenario, scenario, args.duration, args.backend) for scenario in scenarios]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(f"[{len(results)}/{len(scenarios)}] " +
+                  ", ".join(f"{key}={result[key]}" for key in SCENARIO_FIELDS + METRIC_FIELDS[:3]))
+
+    # Completion order depends on scheduling; keep the table in scenario order
+    results.sort(key=lambda result: [result[key] for key in SCENARIO_FIELDS])
+    with open(args.output, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SCENARIO_FIELDS + METRIC_FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"Results saved in: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
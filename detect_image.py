@@ -1,65 +1,253 @@
 import cv2
-from ultralytics import YOLO
 import os
+import csv
+import json
 import time
+import argparse
+import threading
+import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from detector_backend import load_model, boxes_to_numpy, class_mask, class_names
 
 # === CONFIG ===
 IMAGE_FOLDER = r"C:\Users\rajiv\Documents\NorthFolder\north"
 SAVE_FOLDER = os.path.join(IMAGE_FOLDER, "results")
-os.makedirs(SAVE_FOLDER, exist_ok=True)
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
 
 MODEL_PATH = "yolov8m.pt"  # Medium YOLOv8 model for better accuracy
 CONFIDENCE_THRESHOLD = 0.5  # 50% confidence
 IGNORE_CLASSES = ["person"]  # classes to ignore
+BACKEND = "torch"  # "torch", "onnx" or "openvino"; see detector_backend.py
+INT8 = False  # ONNX backends only: use the INT8-quantized export
+CALIBRATION_DIR = None  # INT8 calibration frames; IMAGE_FOLDER works if unset
+THREADS = None  # CPU inference threads
+ANNOTATE = True  # draw boxes and counts, show and save the annotated image
+
+# Batch mode (--batch)
+BATCH_SIZE = 16  # images per inference call
+DECODE_WORKERS = 4  # threads reading and decoding images ahead of inference
+WRITE_WORKERS = 2  # threads encoding and saving annotated images
+MANIFEST_NAME = "counts.jsonl"  # per-image counts in SAVE_FOLDER; use a .csv name for CSV
+
+
+def filter_detections(results):
+    # Filter results for all boxes at once
+    xyxy, conf, cls = boxes_to_numpy(results.boxes)
+    keep = KEEP_CLASSES[cls] & (conf >= CONFIDENCE_THRESHOLD)
+    boxes, cls = xyxy[keep].astype(int), cls[keep]
+    labels = CLASS_NAMES[cls]
+    class_counts = np.bincount(cls, minlength=len(CLASS_NAMES))
+    counts = {CLASS_NAMES[i]: int(class_counts[i]) for i in np.flatnonzero(class_counts)}
+    return boxes, labels, counts
+
+
+def annotate(img, boxes, labels, counts):
+    annotated_img = img.copy()
+    for (x1, y1, x2, y2), label in zip(boxes, labels):
+        cv2.rectangle(annotated_img, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.putText(
+            annotated_img, label, (x1, y1 - 10),
+            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2
+        )
+
+    # Display counts on frame
+    y_offset = 30
+    for vehicle, count in counts.items():
+        cv2.putText(
+            annotated_img, f"{vehicle}: {count}", (10, y_offset),
+            cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2
+        )
+        y_offset += 40
+    return annotated_img
+
 
-# Load YOLO model
-model = YOLO(MODEL_PATH)
+def list_images(folder):
+    return sorted(f for f in os.listdir(folder) if f.lower().endswith(IMAGE_EXTENSIONS))
 
-# Loop through images in folder
-for filename in os.listdir(IMAGE_FOLDER):
-    if filename.lower().endswith((".jpg", ".jpeg", ".png")):
-        image_path = os.path.join(IMAGE_FOLDER, filename)
+
+def run_interactive(folder, save_folder):
+    # Loop through images in folder
+    for filename in list_images(folder):
+        image_path = os.path.join(folder, filename)
         img = cv2.imread(image_path)
 
         results = model(img)[0]  # detect objects
-        boxes, labels, scores = [], [], []
-
-        # Filter results
-        for box, cls, conf in zip(results.boxes.xyxy, results.boxes.cls, results.boxes.conf):
-            label = model.names[int(cls)]
-            if label not in IGNORE_CLASSES and conf >= CONFIDENCE_THRESHOLD:
-                boxes.append(box)
-                labels.append(label)
-                scores.append(conf)
-
-        # Annotate image
-        annotated_img = img.copy()
-        counts = {}
-        for box, label in zip(boxes, labels):
-            x1, y1, x2, y2 = map(int, box)
-            cv2.rectangle(annotated_img, (x1, y1), (x2, y2), (0, 255, 0), 2)
-            cv2.putText(
-                annotated_img, label, (x1, y1 - 10),
-                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2
-            )
-            counts[label] = counts.get(label, 0) + 1
-
-        # Display counts on frame
-        y_offset = 30
-        for vehicle, count in counts.items():
-            cv2.putText(
-                annotated_img, f"{vehicle}: {count}", (10, y_offset),
-                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2
-            )
-            y_offset += 40
+        boxes, labels, counts = filter_detections(results)
+        print(f"{filename}: {counts}")
+        if not ANNOTATE:
+            continue
+        annotated_img = annotate(img, boxes, labels, counts)
 
         # Show frame
         cv2.imshow("Vehicle Detection", annotated_img)
         cv2.waitKey(10000)  # display for 10 seconds
 
         # Save annotated image
-        save_path = os.path.join(SAVE_FOLDER, filename)
+        save_path = os.path.join(save_folder, filename)
         cv2.imwrite(save_path, annotated_img)
 
-cv2.destroyAllWindows()
-print(f"Detection complete! Results saved in: {SAVE_FOLDER}")
\ No newline at end of file
+    cv2.destroyAllWindows()
+
+
+# === BATCH MODE ===
+class Manifest:
+    """Append-only per-image counts, JSONL or CSV by extension; rows are flushed as they land.
+    Images that could not be processed get a row with an error, so a resumed run skips them too."""
+    def __init__(self, path):
+        self.path = path
+        self.csv = path.lower().endswith(".csv")
+        self.fields = ["image", "total"] + [name for name, keep in zip(CLASS_NAMES, KEEP_CLASSES)
+                                            if keep and name is not None] + ["error"]
+        self.lock = threading.Lock()
+
+    def completed(self):
+        # Images already recorded; a line cut short by an interrupted run doesn't count
+        if not os.path.exists(self.path):
+            return set()
+        with open(self.path, newline="") as f:
+            if self.csv:
+                return {row["image"] for row in csv.DictReader(f) if row.get("total")}
+            done = set()
+            for line in f:
+                try:
+                    done.add(json.loads(line)["image"])
+                except ValueError:
+                    pass
+            return done
+
+    def __enter__(self):
+        new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        if not new:
+            # Finish off a line cut short by an interrupted run before appending
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                partial = f.read(1) != b"\n"
+        if self.csv and not new:
+            # Keep appending under the existing header, even one written by an older version
+            with open(self.path, newline="") as f:
+                self.fields = next(csv.reader(f))
+        self.file = open(self.path, "a", newline="")
+        if not new and partial:
+            self.file.write("\n")
+        if self.csv:
+            self.writer = csv.DictWriter(self.file, fieldnames=self.fields, restval=0, extrasaction="ignore")
+            if new:
+                self.writer.writeheader()
+        return self
+
+    def __exit__(self, *exc):
+        self.file.close()
+
+    def add(self, filename, counts, error=None):
+        total = sum(counts.values())
+        with self.lock:
+            if self.csv:
+                self.writer.writerow({"image": filename, "total": total, **counts, "error": error or ""})
+            else:
+                row = {"image": filename, "total": total, "counts": counts}
+                if error:
+                    row["error"] = error
+                self.file.write(json.dumps(row) + "\n")
+            self.file.flush()
+
+
+def decode_ahead(folder, filenames, pool, depth):
+    # Keep `depth` images decoding in the pool ahead of the consumer, in order
+    pending = deque()
+    for filename in filenames:
+        pending.append((filename, pool.submit(cv2.imread, os.path.join(folder, filename))))
+        if len(pending) >= depth:
+            name, future = pending.popleft()
+            yield name, future.result()
+    while pending:
+        name, future = pending.popleft()
+        yield name, future.result()
+
+
+def save_result(manifest, save_folder, filename, annotated_img, counts):
+    # The manifest row is only written once the image is on disk, so a resumed run
+    # never skips an image whose result is missing
+    if annotated_img is not None:
+        cv2.imwrite(os.path.join(save_folder, filename), annotated_img)
+    manifest.add(filename, counts)
+
+
+def run_batch(folder, save_folder, manifest_path, batch_size=BATCH_SIZE,
+              decode_workers=DECODE_WORKERS, write_workers=WRITE_WORKERS, annotate_images=ANNOTATE):
+    """Headless: decode in parallel, detect in batches, write results in the background"""
+    manifest = Manifest(manifest_path)
+    done = manifest.completed()
+    filenames = [f for f in list_images(folder) if f not in done]
+    print(f"{len(done)} images already done, {len(filenames)} to process")
+
+    start = time.perf_counter()
+    processed = 0
+    # Bounds the annotated images waiting for the writers
+    in_flight = threading.BoundedSemaphore(batch_size * 2)
+    with manifest, ThreadPoolExecutor(decode_workers) as decoders, ThreadPoolExecutor(write_workers) as writers:
+        def release(future):
+            in_flight.release()
+            if future.exception():
+                print(f"Failed to save a result: {future.exception()}")
+
+        images = decode_ahead(folder, filenames, decoders, batch_size * 2)
+        while True:
+            batch = []
+            for filename, img in images:
+                if img is None:
+                    print(f"Skipping unreadable image: {filename}")
+                    manifest.add(filename, {}, error="unreadable")
+                    continue
+                batch.append((filename, img))
+                if len(batch) == batch_size:
+                    break
+            if not batch:
+                break
+
+            for (filename, img), results in zip(batch, model([img for _, img in batch], verbose=False)):
+                boxes, labels, counts = filter_detections(results)
+                annotated_img = annotate(img, boxes, labels, counts) if annotate_images else None
+                in_flight.acquire()
+                future = writers.submit(save_result, manifest, save_folder, filename, annotated_img, counts)
+                future.add_done_callback(release)
+
+            processed += len(batch)
+            elapsed = time.perf_counter() - start
+            print(f"{processed}/{len(filenames)} images, {processed / elapsed:.1f} img/s")
+
+
+def main():
+    global model, KEEP_CLASSES, CLASS_NAMES
+    parser = argparse.ArgumentParser(description="Detect and count vehicles in a folder of images")
+    parser.add_argument("--batch", action="store_true",
+                        help="headless batch mode: no display, resumable, writes a counts manifest")
+    parser.add_argument("--folder", default=IMAGE_FOLDER)
+    parser.add_argument("--output", default=None, help="results folder (default: <folder>/results)")
+    parser.add_argument("--manifest", default=None, help=f"counts file, .jsonl or .csv (default: <output>/{MANIFEST_NAME})")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--decode-workers", type=int, default=DECODE_WORKERS)
+    parser.add_argument("--write-workers", type=int, default=WRITE_WORKERS)
+    parser.add_argument("--no-annotate", action="store_true", help="only write counts, no annotated images")
+    args = parser.parse_args()
+
+    save_folder = args.output or (SAVE_FOLDER if args.folder == IMAGE_FOLDER else os.path.join(args.folder, "results"))
+    os.makedirs(save_folder, exist_ok=True)
+
+    # Load YOLO model
+    model = load_model(MODEL_PATH, BACKEND, INT8, CALIBRATION_DIR or args.folder, THREADS)
+    KEEP_CLASSES = ~class_mask(model.names, {c.lower() for c in IGNORE_CLASSES})
+    CLASS_NAMES = class_names(model.names)
+
+    if args.batch:
+        run_batch(args.folder, save_folder, args.manifest or os.path.join(save_folder, MANIFEST_NAME),
+                  args.batch_size, args.decode_workers, args.write_workers,
+                  ANNOTATE and not args.no_annotate)
+    else:
+        run_interactive(args.folder, save_folder)
+    print(f"Detection complete! Results saved in: {save_folder}")
+
+
+if __name__ == "__main__":
+    main()
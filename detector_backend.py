@@ -0,0 +1,387 @@
+"""Pluggable YOLO detector backends for app.py and detect_image.py
+
+load_model() returns something that can be called like ultralytics.YOLO:
+model(frames, conf=..., imgsz=...) gives one result per frame with
+.boxes.xyxy/.conf/.cls arrays, and model.names maps class ids to labels.
+
+Backends:
+  torch     ultralytics PyTorch eager inference (the original path)
+  onnx      ONNX Runtime on CPU
+  openvino  OpenVINO on CPU
+
+The ONNX backends export the .pt weights once and cache the model next to
+them; with int8=True the export is statically quantized using images from
+a calibration folder of our own footage. Run this file to export ahead of
+time or to compare backends for accuracy and latency:
+
+  python detector_backend.py export yolov8m.pt --int8 --calibration-dir frames/
+  python detector_backend.py compare yolov8m.pt --images frames/ --backends torch onnx onnx-int8
+"""
+import os
+import ast
+import json
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+DEFAULT_IMGSZ = 640
+STRIDE = 32
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+# === RESULTS ===
+class Boxes:
+    """NumPy stand-in for ultralytics Boxes; rows are [x1, y1, x2, y2, conf, cls]"""
+    def __init__(self, data):
+        self.data = np.asarray(data, dtype=np.float32).reshape(-1, 6)
+        
+    @property
+    def xyxy(self):
+        return self.data[:, :4]
+        
+    @property
+    def conf(self):
+        return self.data[:, 4]
+        
+    @property
+    def cls(self):
+        return self.data[:, 5]
+        
+    def __len__(self):
+        return len(self.data)
+        
+    def __iter__(self):
+        # Per-box views so `box.cls[0]` / `box.xyxy[0]` loops keep working
+        for i in range(len(self.data)):
+            yield Boxes(self.data[i:i + 1])
+
+
+class Results:
+    def __init__(self, boxes, names, orig_shape):
+        self.boxes = boxes
+        self.names = names
+        self.orig_shape = orig_shape
+
+
+def boxes_to_numpy(boxes):
+    """(xyxy, conf, cls) NumPy arrays for a whole ultralytics or detector_backend Boxes at once"""
+    data = boxes.data
+    data = data.cpu().numpy() if hasattr(data, "cpu") else np.asarray(data)
+    return data[:, :4], data[:, 4], data[:, 5].astype(int)
+
+
+def class_mask(names, labels):
+    """Boolean lookup by class id: True where the lowercased class name is in labels"""
+    mask = np.zeros(max(names) + 1, dtype=bool)
+    for class_id, name in names.items():
+        mask[class_id] = name.lower() in labels
+    return mask
+
+
+def class_names(names):
+    """Lowercased class names as an array indexed by class id"""
+    lookup = np.empty(max(names) + 1, dtype=object)
+    for class_id, name in names.items():
+        lookup[class_id] = name.lower()
+    return lookup
+
+
+# === PRE / POST PROCESSING ===
+def letterbox(img, size):
+    """Resize keeping aspect ratio and pad to size x size; returns (image, scale, (pad_x, pad_y))"""
+    h, w = img.shape[:2]
+    scale = min(size / h, size / w)
+    new_w, new_h = round(w * scale), round(h * scale)
+    pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+    out = np.full((size, size, 3), 114, dtype=np.uint8)
+    out[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    return out, scale, (pad_x, pad_y)
+
+
+def undo_letterbox(xyxy, scale, pad, shape):
+    """Map xyxy boxes from letterboxed coordinates back onto the original (h, w) image"""
+    xyxy = (xyxy - np.tile(pad, 2)) / scale
+    xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, shape[1])
+    xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, shape[0])
+    return xyxy
+
+
+def nms(xyxy, conf, cls, iou=0.7, conf_threshold=0.0):
+    """Class-aware NMS; returns the indices kept, best first"""
+    if not len(conf):
+        return np.zeros(0, dtype=int)
+    xywh = np.column_stack([xyxy[:, :2], xyxy[:, 2:] - xyxy[:, :2]])
+    return np.asarray(cv2.dnn.NMSBoxesBatched(xywh.tolist(), conf.tolist(), cls.tolist(),
+                                              conf_threshold, iou), dtype=int).reshape(-1)
+
+
+def preprocess(images, size):
+    """BGR uint8 images -> NCHW float32 RGB batch plus each image's letterbox transform"""
+    batch = np.empty((len(images), 3, size, size), dtype=np.float32)
+    transforms = []
+    for i, img in enumerate(images):
+        boxed, scale, pad = letterbox(img, size)
+        batch[i] = boxed[:, :, ::-1].transpose(2, 0, 1) / 255.0
+        transforms.append((scale, pad, img.shape[:2]))
+    return batch, transforms
+
+
+def postprocess(output, transforms, conf=0.25, iou=0.7, max_det=300):
+    """YOLOv8 head output (B, 4 + classes, anchors) -> per-image [x1, y1, x2, y2, conf, cls] arrays"""
+    detections = []
+    for pred, (scale, (pad_x, pad_y), (h, w)) in zip(output, transforms):
+        pred = pred.T
+        scores = pred[:, 4:]
+        cls = scores.argmax(axis=1)
+        best = scores[np.arange(len(scores)), cls]
+        keep = best >= conf
+        xywh, best, cls = pred[keep, :4], best[keep], cls[keep]
+        if not len(best):
+            detections.append(np.zeros((0, 6), dtype=np.float32))
+            continue
+        
+        xyxy = np.column_stack([xywh[:, :2] - xywh[:, 2:] / 2, xywh[:, :2] + xywh[:, 2:] / 2])
+        kept = nms(xyxy, best, cls, iou, conf)[:max_det]
+        xyxy = undo_letterbox(xyxy[kept], scale, (pad_x, pad_y), (h, w))
+        detections.append(np.column_stack([xyxy, best[kept], cls[kept]]).astype(np.float32))
+    return detections
+
+
+# === EXPORT ===
+def _is_fresh(path, source):
+    return os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(source)
+
+
+def calibration_images(calibration_dir, limit=200):
+    names = sorted(f for f in os.listdir(calibration_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+    for name in names[:limit]:
+        img = cv2.imread(os.path.join(calibration_dir, name))
+        if img is not None:
+            yield img
+
+
+def export_onnx(weights_path, imgsz=DEFAULT_IMGSZ, int8=False, calibration_dir=None):
+    """Export weights to ONNX once, cached next to them; returns the .onnx path"""
+    stem = os.path.splitext(weights_path)[0]
+    onnx_path = stem + ".onnx"
+    names_path = stem + ".names.json"
+    if not (_is_fresh(onnx_path, weights_path) and _is_fresh(names_path, weights_path)):
+        from ultralytics import YOLO
+        model = YOLO(weights_path)
+        exported = model.export(format="onnx", dynamic=True, imgsz=imgsz)
+        if os.path.abspath(exported) != os.path.abspath(onnx_path):
+            os.replace(exported, onnx_path)
+        with open(names_path, "w") as f:
+            json.dump({int(k): v for k, v in model.names.items()}, f)
+    if not int8:
+        return onnx_path
+    
+    int8_path = stem + ".int8.onnx"
+    if _is_fresh(int8_path, onnx_path):
+        return int8_path
+    if not calibration_dir:
+        raise ValueError("INT8 export needs a calibration_dir of representative frames")
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    
+    class FrameReader(CalibrationDataReader):
+        def __init__(self, input_name):
+            self.input_name = input_name
+            self.images = calibration_images(calibration_dir)
+            
+        def get_next(self):
+            img = next(self.images, None)
+            if img is None:
+                return None
+            return {self.input_name: preprocess([img], imgsz)[0]}
+            
+    import onnxruntime as ort
+    input_name = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    quantize_static(onnx_path, int8_path, FrameReader(input_name), quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, per_channel=True)
+    return int8_path
+
+
+def _load_names(onnx_path):
+    stem = onnx_path[:-len(".int8.onnx")] if onnx_path.endswith(".int8.onnx") else os.path.splitext(onnx_path)[0]
+    names_path = stem + ".names.json"
+    if os.path.exists(names_path):
+        with open(names_path) as f:
+            return {int(k): v for k, v in json.load(f).items()}
+    # ultralytics also stores the names in the ONNX metadata
+    import onnxruntime as ort
+    meta = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"]).get_modelmeta()
+    return ast.literal_eval(meta.custom_metadata_map["names"])
+
+
+# === RUNNERS ===
+class ExportedDetector:
+    """Callable like ultralytics.YOLO for an exported ONNX detector"""
+    def __init__(self, onnx_path, imgsz=DEFAULT_IMGSZ):
+        self.path = onnx_path
+        self.imgsz = imgsz
+        self.names = _load_names(onnx_path)
+        
+    def __call__(self, source, conf=0.25, iou=0.7, imgsz=None, max_det=300, **kwargs):
+        images = source if isinstance(source, list) else [source]
+        if not images:
+            return []
+        # The export is dynamic, so any stride multiple works as an input size
+        size = -(-(imgsz or self.imgsz) // STRIDE) * STRIDE
+        batch, transforms = preprocess(images, size)
+        detections = postprocess(self.infer(batch), transforms, conf, iou, max_det)
+        return [Results(Boxes(d), self.names, t[2]) for d, t in zip(detections, transforms)]
+
+
+class OnnxRuntimeDetector(ExportedDetector):
+    def __init__(self, onnx_path, imgsz=DEFAULT_IMGSZ, threads=None):
+        super().__init__(onnx_path, imgsz)
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        
+    def infer(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVinoDetector(ExportedDetector):
+    def __init__(self, onnx_path, imgsz=DEFAULT_IMGSZ, threads=None):
+        super().__init__(onnx_path, imgsz)
+        import openvino as ov
+        config = {"PERFORMANCE_HINT": "LATENCY"}
+        if threads:
+            config["INFERENCE_NUM_THREADS"] = threads
+        self.compiled = ov.Core().compile_model(onnx_path, "CPU", config)
+        self.output = self.compiled.output(0)
+        
+    def infer(self, batch):
+        return self.compiled(batch)[self.output]
+
+
+def load_model(weights_path, backend="torch", int8=False, calibration_dir=None, threads=None,
+               imgsz=DEFAULT_IMGSZ):
+    """Load a detector for weights_path on the given backend ("torch", "onnx" or "openvino")"""
+    if backend == "torch":
+        from ultralytics import YOLO
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        return YOLO(weights_path)
+    
+    onnx_path = weights_path if weights_path.endswith(".onnx") else export_onnx(
+        weights_path, imgsz, int8, calibration_dir)
+    if backend == "onnx":
+        return OnnxRuntimeDetector(onnx_path, imgsz, threads)
+    if backend == "openvino":
+        return OpenVinoDetector(onnx_path, imgsz, threads)
+    raise ValueError(f"Unknown detector backend: {backend}")
+
+
+# === COMPARISON ===
+def _box_iou(a, b):
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def match_counts(reference, candidate, iou_threshold=0.5):
+    """Greedy same-class IoU matching; returns (matched, reference boxes, candidate boxes)"""
+    if not len(reference) or not len(candidate):
+        return 0, len(reference), len(candidate)
+    iou = _box_iou(reference[:, :4], candidate[:, :4])
+    iou[reference[:, None, 5] != candidate[None, :, 5]] = 0
+    matched = 0
+    while True:
+        r, c = np.unravel_index(iou.argmax(), iou.shape)
+        if iou[r, c] < iou_threshold:
+            break
+        matched += 1
+        iou[r, :] = 0
+        iou[:, c] = 0
+    return matched, len(reference), len(candidate)
+
+
+def compare(weights_path, image_dir, backends, threads=None, imgsz=DEFAULT_IMGSZ, conf=0.25,
+            calibration_dir=None, limit=100, warmup=3):
+    """Time each backend per image and score its boxes against the first backend's"""
+    images = list(calibration_images(image_dir, limit))
+    if not images:
+        raise ValueError(f"No images found in {image_dir}")
+    
+    outputs, rows = {}, []
+    for name in backends:
+        backend, _, variant = name.partition("-")
+        model = load_model(weights_path, backend, int8=variant == "int8", calibration_dir=calibration_dir or image_dir,
+                           threads=threads, imgsz=imgsz)
+        for img in images[:warmup]:
+            model(img, conf=conf, imgsz=imgsz, verbose=False)
+        latencies, detections = [], []
+        for img in images:
+            start = time.perf_counter()
+            res = model(img, conf=conf, imgsz=imgsz, verbose=False)[0]
+            latencies.append((time.perf_counter() - start) * 1000)
+            xyxy, scores, cls = boxes_to_numpy(res.boxes)
+            detections.append(np.column_stack([xyxy, scores, cls]))
+        outputs[name] = detections
+        
+        matched = ref_total = cand_total = 0
+        for ref, cand in zip(outputs[backends[0]], detections):
+            m, r, c = match_counts(ref, cand)
+            matched, ref_total, cand_total = matched + m, ref_total + r, cand_total + c
+        rows.append({
+            "backend": name,
+            "mean_ms": round(float(np.mean(latencies)), 1),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 1),
+            "boxes": cand_total,
+            "recall": round(matched / ref_total, 3) if ref_total else 1.0,
+            "precision": round(matched / cand_total, 3) if cand_total else 1.0,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export and compare YOLO detector backends")
+    sub = parser.add_subparsers(dest="command", required=True)
+    
+    export_parser = sub.add_parser("export", help="export weights to a cached ONNX model")
+    export_parser.add_argument("weights")
+    export_parser.add_argument("--imgsz", type=int, default=DEFAULT_IMGSZ)
+    export_parser.add_argument("--int8", action="store_true", help="also build the INT8-quantized model")
+    export_parser.add_argument("--calibration-dir", help="folder of representative frames for INT8 calibration")
+    
+    compare_parser = sub.add_parser("compare", help="compare latency and boxes across backends")
+    compare_parser.add_argument("weights")
+    compare_parser.add_argument("--images", required=True, help="folder of test images")
+    compare_parser.add_argument("--backends", nargs="+", default=["torch", "onnx"],
+                                help="torch, onnx, onnx-int8, openvino, openvino-int8; the first is the reference")
+    compare_parser.add_argument("--threads", type=int, default=None)
+    compare_parser.add_argument("--imgsz", type=int, default=DEFAULT_IMGSZ)
+    compare_parser.add_argument("--conf", type=float, default=0.25)
+    compare_parser.add_argument("--calibration-dir", help="INT8 calibration frames (default: --images)")
+    compare_parser.add_argument("--limit", type=int, default=100, help="maximum images to run")
+    args = parser.parse_args()
+    
+    if args.command == "export":
+        print(export_onnx(args.weights, args.imgsz, args.int8, args.calibration_dir))
+        return
+    
+    rows = compare(args.weights, args.images, args.backends, args.threads, args.imgsz, args.conf,
+                   args.calibration_dir, args.limit)
+    print(f"{'backend':<16}{'mean ms':>10}{'p95 ms':>10}{'boxes':>8}{'recall':>9}{'precision':>11}")
+    for row in rows:
+        print(f"{row['backend']:<16}{row['mean_ms']:>10}{row['p95_ms']:>10}{row['boxes']:>8}"
+              f"{row['recall']:>9}{row['precision']:>11}")
+
+
+if __name__ == "__main__":
+    main()
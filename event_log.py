@@ -0,0 +1,74 @@
+"""Compact binary event log for final2.py simulation runs
+
+Layout: a header (magic, version, seed, length-prefixed JSON run config)
+followed by records of a frame number, an event kind and a fixed-size
+payload for that kind. Frames count completed simulation steps, so an
+event tagged N happened before step N + 1 moved anything.
+"""
+import json
+import struct
+
+MAGIC = b"TSEL"
+VERSION = 1
+
+# Event kinds
+SPAWN = 1      # x, y, direction, vehicle type value
+LIGHT = 2      # light index, NS state value, EW state value
+EMERGENCY = 3  # 1 when an emergency activates, 0 when it clears
+CLEAR = 4      # all vehicles removed
+RESET = 5      # statistics reset
+END = 6        # run finished; frame is the number of frames simulated
+
+# Events fed back into a replay; everything else is checked against it
+INPUT_EVENTS = (SPAWN, CLEAR, RESET)
+
+_HEADER = struct.Struct("<4sBQI")
+_RECORD = struct.Struct("<IB")
+_PAYLOADS = {
+    SPAWN: struct.Struct("<ddBB"),
+    LIGHT: struct.Struct("<IBB"),
+    EMERGENCY: struct.Struct("<B"),
+    CLEAR: struct.Struct("<"),
+    RESET: struct.Struct("<"),
+    END: struct.Struct("<"),
+}
+
+
+class EventLogWriter:
+    def __init__(self, path, seed, config=None):
+        self.file = open(path, "wb")
+        config_bytes = json.dumps(config or {}).encode()
+        self.file.write(_HEADER.pack(MAGIC, VERSION, seed, len(config_bytes)))
+        self.file.write(config_bytes)
+
+    def record(self, frame, kind, *fields):
+        self.file.write(_RECORD.pack(frame, kind) + _PAYLOADS[kind].pack(*fields))
+
+    def close(self, frame):
+        """Mark the end of the run after `frame` frames and close the file"""
+        self.record(frame, END)
+        self.file.close()
+
+
+def read_event_log(path):
+    """Return (seed, config, events) where events are (frame, kind, fields) tuples"""
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, seed, config_length = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a simulation event log")
+    if version != VERSION:
+        raise ValueError(f"{path} has event log version {version}, expected {VERSION}")
+
+    offset = _HEADER.size
+    config = json.loads(data[offset:offset + config_length])
+    offset += config_length
+
+    events = []
+    while offset < len(data):
+        frame, kind = _RECORD.unpack_from(data, offset)
+        offset += _RECORD.size
+        payload = _PAYLOADS[kind]
+        events.append((frame, kind, payload.unpack_from(data, offset)))
+        offset += payload.size
+    return seed, config, events
@@ -3,7 +3,13 @@ import sys
 import math
 import random
 import time
+import argparse
+import bisect
+from collections import OrderedDict, namedtuple
 from enum import Enum
+import numpy as np
+
+import event_log
 
 # Initialize pygame
 pygame.init()
@@ -12,6 +18,20 @@ pygame.init()
 SCREEN_WIDTH = 1400
 SCREEN_HEIGHT = 900
 FPS = 60
+STEP_MS = 1000 / FPS  # Simulated milliseconds advanced per frame
+
+# Road grid and traffic light geometry
+ROAD_X_POSITIONS = [300, 500, 700, 900]
+ROAD_Y_POSITIONS = [200, 350, 500, 650]
+APPROACH_DISTANCE = 80  # How far before a light vehicles check its state
+LANE_HALF_WIDTH = 30    # Lateral tolerance for a vehicle to be "at" a light
+
+# Intelligent Driver Model (IDM) car following, in pixels and frames
+IDM_MAX_ACCEL = 0.1       # Acceleration from standstill (px/frame^2)
+IDM_COMFORT_DECEL = 0.2   # Comfortable braking (px/frame^2)
+IDM_MIN_GAP = 8           # Bumper-to-bumper gap when queued (px)
+IDM_TIME_HEADWAY = 15     # Desired time gap to the leader (frames)
+IDM_BRAKE_TERM = 2 * math.sqrt(IDM_MAX_ACCEL * IDM_COMFORT_DECEL)
 
 # Colors - Pixel art palette
 BLACK = (0, 0, 0)
@@ -42,6 +62,14 @@ class VehicleType(Enum):
     TRUCK = 3
     POLICE = 4
 
+# Base speed in pixels per frame for each vehicle type
+VEHICLE_SPEEDS = {
+    VehicleType.CAR: 2,
+    VehicleType.AMBULANCE: 2.5,
+    VehicleType.TRUCK: 1.5,
+    VehicleType.POLICE: 3,
+}
+
 def create_car_sprite():
     """Create a pixelated car sprite"""
     surface = pygame.Surface((32, 16), pygame.SRCALPHA)
@@ -133,6 +161,66 @@ def rotate_sprite(surface, angle):
     """Rotate sprite for different directions"""
     return pygame.transform.rotate(surface, angle)
 
+# Sprite factory and unrotated (width, height) for each vehicle type
+VEHICLE_SPRITES = {
+    VehicleType.CAR: (create_car_sprite, (32, 16)),
+    VehicleType.AMBULANCE: (create_ambulance_sprite, (40, 20)),
+    VehicleType.TRUCK: (create_truck_sprite, (48, 24)),
+    VehicleType.POLICE: (create_police_sprite, (34, 18)),
+}
+ROTATION_ANGLES = {0: 0, 1: -90, 2: 180, 3: 90}
+SIREN_MAX_RADIUS = 60
+
+# Process-wide sprite atlas, shared by every vehicle so spawning allocates nothing
+_sprite_atlas = {}
+_siren_halos = {}
+
+def get_vehicle_sprite(vehicle_type, direction=0):
+    """Shared sprite for a vehicle type facing `direction`, built on first use"""
+    key = (vehicle_type, direction)
+    sprite = _sprite_atlas.get(key)
+    if sprite is None:
+        if direction == 0:
+            sprite = VEHICLE_SPRITES[vehicle_type][0]()
+        else:
+            sprite = rotate_sprite(get_vehicle_sprite(vehicle_type, 0), ROTATION_ANGLES[direction])
+        _sprite_atlas[key] = sprite
+    return sprite
+
+def get_siren_halo(radius, color):
+    """Pre-rendered translucent siren circle, cached by radius and colour"""
+    key = (radius, color)
+    halo = _siren_halos.get(key)
+    if halo is None:
+        # Halo fades out as it grows
+        alpha = int(100 * (1 - radius / SIREN_MAX_RADIUS))
+        halo = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+        pygame.draw.circle(halo, (*color[:3], alpha), (radius, radius), radius)
+        _siren_halos[key] = halo
+    return halo
+
+class TextCache:
+    """LRU cache of rendered text surfaces keyed on (font, text, colour)"""
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.surfaces = OrderedDict()
+        
+    def render(self, font, text, antialias, color):
+        """Same arguments as font.render, with the font first"""
+        key = (font, text, antialias, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+        surface = font.render(text, antialias, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.maxsize:
+            self.surfaces.popitem(last=False)
+        return surface
+
+# Shared by every UI element, so unchanged strings are never rasterised twice
+text_cache = TextCache()
+
 class Vehicle:
     def __init__(self, x, y, direction, vehicle_type=VehicleType.CAR):
         self.x = x
@@ -141,55 +229,43 @@ class Vehicle:
         self.vehicle_type = vehicle_type
         
         # Set speed based on vehicle type
-        if vehicle_type == VehicleType.TRUCK:
-            self.speed = 1.5
-        elif vehicle_type == VehicleType.AMBULANCE:
-            self.speed = 2.5
-        elif vehicle_type == VehicleType.POLICE:
-            self.speed = 3
-        else:
-            self.speed = 2
+        self.speed = VEHICLE_SPEEDS[vehicle_type]
             
         self.original_speed = self.speed
         self.stopped = False
         self.emergency_mode = False
+        self.delay_frames = 0  # Frames lost to stops and slowdowns
         
-        # Create sprite based on vehicle type
-        if vehicle_type == VehicleType.CAR:
-            self.base_sprite = create_car_sprite()
-            self.width, self.height = 32, 16
-        elif vehicle_type == VehicleType.AMBULANCE:
-            self.base_sprite = create_ambulance_sprite()
-            self.width, self.height = 40, 20
-        elif vehicle_type == VehicleType.TRUCK:
-            self.base_sprite = create_truck_sprite()
-            self.width, self.height = 48, 24
-        elif vehicle_type == VehicleType.POLICE:
-            self.base_sprite = create_police_sprite()
-            self.width, self.height = 34, 18
-            
-        # Rotate sprite based on direction
-        rotation_angles = {0: 0, 1: -90, 2: 180, 3: 90}
-        self.sprite = rotate_sprite(self.base_sprite, rotation_angles[direction])
+        # Sprites come from the shared atlas, already rotated for the direction
+        self.base_sprite = get_vehicle_sprite(vehicle_type)
+        self.width, self.height = VEHICLE_SPRITES[vehicle_type][1]
+        self.sprite = get_vehicle_sprite(vehicle_type, direction)
         
         # Emergency lights animation
         self.light_timer = 0
         self.siren_radius = 0
         
-    def update(self, traffic_lights, emergency_active):
+    def update(self, light_grid, emergency_active, gap=None, leader_speed=None):
+        """Advance one frame; `gap`/`leader_speed` describe the vehicle ahead in this lane"""
         if self.vehicle_type in [VehicleType.AMBULANCE, VehicleType.POLICE]:
             self.emergency_mode = emergency_active
             
         # Check if vehicle should stop at traffic light
-        should_stop = self.check_traffic_light_collision(traffic_lights)
+        should_stop = self.check_traffic_light_collision(light_grid)
         
         if should_stop and not self.emergency_mode:
             self.speed = 0
             self.stopped = True
         else:
             speed_multiplier = 1.5 if self.emergency_mode else 1
-            self.speed = self.original_speed * speed_multiplier
-            self.stopped = False
+            desired_speed = self.original_speed * speed_multiplier
+            # Follow the leader, except emergency vehicles which traffic yields to
+            if gap is not None and not self.emergency_mode:
+                self.speed = idm_speed(self.speed, desired_speed, gap, self.speed - leader_speed)
+            else:
+                self.speed = desired_speed
+            self.stopped = self.speed == 0
+        self.delay_frames += 1 - self.speed / self.original_speed
             
         # Move vehicle
         if self.direction == 0:  # Right
@@ -204,46 +280,22 @@ class Vehicle:
         # Update emergency effects
         self.light_timer += 1
         if self.emergency_mode:
-            self.siren_radius = min(self.siren_radius + 2, 60)
+            self.siren_radius = min(self.siren_radius + 2, SIREN_MAX_RADIUS)
         else:
             self.siren_radius = max(self.siren_radius - 3, 0)
             
-    def check_traffic_light_collision(self, traffic_lights):
-        for light in traffic_lights:
-            approach_distance = 80
-            
-            if self.direction == 0:  # Moving right
-                if (light.x - approach_distance < self.x < light.x and 
-                    abs(self.y - light.y) < 30):
-                    return light.get_state_for_direction(self.direction) == TrafficLightState.RED
-                    
-            elif self.direction == 1:  # Moving down
-                if (light.y - approach_distance < self.y < light.y and 
-                    abs(self.x - light.x) < 30):
-                    return light.get_state_for_direction(self.direction) == TrafficLightState.RED
-                    
-            elif self.direction == 2:  # Moving left
-                if (light.x < self.x < light.x + approach_distance and 
-                    abs(self.y - light.y) < 30):
-                    return light.get_state_for_direction(self.direction) == TrafficLightState.RED
-                    
-            elif self.direction == 3:  # Moving up
-                if (light.y < self.y < light.y + approach_distance and 
-                    abs(self.x - light.x) < 30):
-                    return light.get_state_for_direction(self.direction) == TrafficLightState.RED
-                    
-        return False
+    def check_traffic_light_collision(self, light_grid):
+        light = light_grid.light_ahead(self.x, self.y, self.direction)
+        if light is None:
+            return False
+        return light.get_state_for_direction(self.direction) == TrafficLightState.RED
         
     def draw(self, screen):
         # Draw siren effect for emergency vehicles
         if self.siren_radius > 0:
             # Pulsing siren effect
-            alpha = int(100 * (1 - self.siren_radius / 60))
-            siren_surface = pygame.Surface((self.siren_radius * 2, self.siren_radius * 2), pygame.SRCALPHA)
-            
             color = RED if (self.light_timer // 15) % 2 else BLUE
-            pygame.draw.circle(siren_surface, (*color[:3], alpha), 
-                             (self.siren_radius, self.siren_radius), self.siren_radius)
+            siren_surface = get_siren_halo(self.siren_radius, color)
             
             screen.blit(siren_surface, 
                        (self.x - self.siren_radius + self.width//2, 
@@ -269,23 +321,42 @@ class Vehicle:
                     pygame.draw.circle(screen, RED, (int(self.x + 5), int(self.y + 5)), 4)
                     pygame.draw.circle(screen, BLUE, (int(self.x + self.width - 5), int(self.y + 5)), 4)
                     
-    def is_off_screen(self):
-        return (self.x < -100 or self.x > SCREEN_WIDTH + 100 or 
-                self.y < -100 or self.y > SCREEN_HEIGHT + 100)
+    def get_rect(self):
+        """Screen area touched by draw(), including siren halo and emergency lights"""
+        rect = self.sprite.get_rect(topleft=(int(self.x), int(self.y)))
+        # Emergency lights are placed from the unrotated size and can poke outside the sprite
+        rect.union_ip(pygame.Rect(int(self.x), int(self.y), self.width, self.height).inflate(8, 8))
+        if self.siren_radius > 0:
+            rect.union_ip(pygame.Rect(int(self.x - self.siren_radius + self.width//2),
+                                      int(self.y - self.siren_radius + self.height//2),
+                                      self.siren_radius * 2 + 1, self.siren_radius * 2 + 1))
+        return rect
+        
+    def get_draw_state(self):
+        """Everything besides position that changes how draw() looks"""
+        lights_on = (self.light_timer // 10) % 2 if self.emergency_mode else None
+        siren_color = (self.light_timer // 15) % 2 if self.siren_radius > 0 else None
+        return lights_on, siren_color
+        
+    def is_off_screen(self, width=SCREEN_WIDTH, height=SCREEN_HEIGHT):
+        return (self.x < -100 or self.x > width + 100 or 
+                self.y < -100 or self.y > height + 100)
 
 class TrafficLight:
-    def __init__(self, x, y):
+    def __init__(self, x, y, get_ticks=pygame.time.get_ticks, green_interval=4000):
         self.x = x
         self.y = y
+        self.get_ticks = get_ticks
+        self.green_interval = green_interval
         self.ns_state = TrafficLightState.GREEN
         self.ew_state = TrafficLightState.RED
         self.emergency_mode = False
-        self.last_change = pygame.time.get_ticks()
-        self.change_interval = 4000
+        self.last_change = get_ticks()
+        self.change_interval = green_interval
         self.emergency_override = False
         
     def update(self, emergency_detected, ambulance_direction=None):
-        current_time = pygame.time.get_ticks()
+        current_time = self.get_ticks()
         
         if emergency_detected and not self.emergency_override:
             self.emergency_mode = True
@@ -297,6 +368,10 @@ class TrafficLight:
         if self.emergency_mode and not emergency_detected:
             self.emergency_mode = False
             self.emergency_override = False
+            # Both directions were held red; restart the normal cycle or nothing turns green again
+            self.ns_state = TrafficLightState.GREEN
+            self.ew_state = TrafficLightState.RED
+            self.change_interval = self.green_interval
             self.last_change = current_time
             
         if not self.emergency_mode and current_time - self.last_change > self.change_interval:
@@ -306,14 +381,14 @@ class TrafficLight:
             elif self.ns_state == TrafficLightState.YELLOW:
                 self.ns_state = TrafficLightState.RED
                 self.ew_state = TrafficLightState.GREEN
-                self.change_interval = 4000
+                self.change_interval = self.green_interval
             elif self.ew_state == TrafficLightState.GREEN:
                 self.ew_state = TrafficLightState.YELLOW
                 self.change_interval = 1500
             elif self.ew_state == TrafficLightState.YELLOW:
                 self.ew_state = TrafficLightState.RED
                 self.ns_state = TrafficLightState.GREEN
-                self.change_interval = 4000
+                self.change_interval = self.green_interval
                 
             self.last_change = current_time
             
@@ -331,6 +406,15 @@ class TrafficLight:
             self.ns_state = TrafficLightState.GREEN
             self.ew_state = TrafficLightState.RED
             
+    def get_rect(self):
+        """Screen area touched by draw(): post, both light boxes and the beacon"""
+        return pygame.Rect(self.x - 12, self.y - 35, 42, 100)
+        
+    def get_draw_state(self):
+        # The emergency beacon flashes on the wall clock, so treat it as always animating
+        beacon = pygame.time.get_ticks() if self.emergency_mode else None
+        return self.ns_state, self.ew_state, beacon
+        
     def draw(self, screen):
         # Draw traffic light housing - pixelated style
         # Main post
@@ -370,10 +454,358 @@ class TrafficLight:
                 pygame.draw.circle(screen, EMERGENCY_RED, (self.x, self.y + 35), 8)
                 pygame.draw.circle(screen, WHITE, (self.x, self.y + 35), 4)
 
-def draw_road_network(screen):
+class LightGrid:
+    """Uniform-grid spatial index over traffic lights
+    
+    Lights are bucketed into square cells, so a query only visits the few
+    cells around the query point no matter how many intersections exist.
+    Candidates are checked in their original list order, which keeps results
+    identical to a linear scan over the lights.
+    """
+    def __init__(self, traffic_lights, cell_size=200):
+        self.lights = traffic_lights
+        self.cell_size = cell_size
+        self.cells = {}
+        for i, light in enumerate(traffic_lights):
+            self.cells.setdefault(self._cell(light.x, light.y), []).append((i, light))
+            
+    def _cell(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+        
+    def _candidates(self, x0, y0, x1, y1):
+        """Lights in the cells overlapping the box, sorted by light index"""
+        cx0, cy0 = self._cell(x0, y0)
+        cx1, cy1 = self._cell(x1, y1)
+        candidates = []
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                candidates.extend(self.cells.get((cx, cy), ()))
+        candidates.sort(key=lambda item: item[0])
+        return candidates
+        
+    def light_ahead(self, x, y, direction):
+        """Return the light whose approach zone contains (x, y) for `direction`, or None"""
+        if direction == 0:  # Moving right
+            box = (x, y - LANE_HALF_WIDTH, x + APPROACH_DISTANCE, y + LANE_HALF_WIDTH)
+        elif direction == 1:  # Moving down
+            box = (x - LANE_HALF_WIDTH, y, x + LANE_HALF_WIDTH, y + APPROACH_DISTANCE)
+        elif direction == 2:  # Moving left
+            box = (x - APPROACH_DISTANCE, y - LANE_HALF_WIDTH, x, y + LANE_HALF_WIDTH)
+        else:  # Moving up
+            box = (x - LANE_HALF_WIDTH, y - APPROACH_DISTANCE, x + LANE_HALF_WIDTH, y)
+            
+        for _, light in self._candidates(*box):
+            if direction == 0:
+                if light.x - APPROACH_DISTANCE < x < light.x and abs(y - light.y) < LANE_HALF_WIDTH:
+                    return light
+            elif direction == 1:
+                if light.y - APPROACH_DISTANCE < y < light.y and abs(x - light.x) < LANE_HALF_WIDTH:
+                    return light
+            elif direction == 2:
+                if light.x < x < light.x + APPROACH_DISTANCE and abs(y - light.y) < LANE_HALF_WIDTH:
+                    return light
+            elif direction == 3:
+                if light.y < y < light.y + APPROACH_DISTANCE and abs(x - light.x) < LANE_HALF_WIDTH:
+                    return light
+        return None
+        
+    def lights_within(self, x, y, radius):
+        """Return (index, light, distance) for every light closer than `radius`"""
+        found = []
+        radius_sq = radius * radius
+        for i, light in self._candidates(x - radius, y - radius, x + radius, y + radius):
+            distance_sq = (x - light.x)**2 + (y - light.y)**2
+            if distance_sq < radius_sq:
+                found.append((i, light, math.sqrt(distance_sq)))
+        return found
+
+def idm_speed(speed, desired_speed, gap, closing_speed):
+    """Speed after one frame of IDM acceleration behind a leader `gap` pixels ahead"""
+    if gap <= 0:
+        return 0.0
+    desired_gap = IDM_MIN_GAP + max(0.0, speed * IDM_TIME_HEADWAY + speed * closing_speed / IDM_BRAKE_TERM)
+    free_ratio = speed / desired_speed
+    free_ratio *= free_ratio
+    gap_ratio = desired_gap / gap
+    accel = IDM_MAX_ACCEL * (1 - free_ratio * free_ratio - gap_ratio * gap_ratio)
+    return min(desired_speed, max(0.0, speed + accel))
+
+def lane_key(vehicle):
+    """Vehicles never change lanes: a lane is a direction plus the road it runs on"""
+    return vehicle.direction, vehicle.y if vehicle.direction in (0, 2) else vehicle.x
+
+def lane_progress(vehicle):
+    """Distance travelled along the lane's direction of travel"""
+    if vehicle.direction == 0:
+        return vehicle.x
+    elif vehicle.direction == 1:
+        return vehicle.y
+    elif vehicle.direction == 2:
+        return -vehicle.x
+    return -vehicle.y
+
+def lane_gap(follower, leader):
+    """Free road between the follower's front and the leader's rear"""
+    # Positions are sprite top-left corners, so subtract whichever body lies between them
+    body = follower.width if follower.direction in (0, 1) else leader.width
+    return lane_progress(leader) - lane_progress(follower) - body
+
+class LaneQueues:
+    """Per-lane vehicle queues kept sorted by progress along the road
+    
+    Each vehicle's leader is simply the next entry in its queue. Queues are
+    re-sorted every frame to absorb emergency vehicles overtaking, which is
+    linear time since the order almost never changes. Ties in progress go to
+    the earlier spawn, matching VehicleFleet.
+    """
+    def __init__(self):
+        self.lanes = {}
+        self.spawn_order = {}
+        self.spawned = 0
+        
+    def _sort_key(self, vehicle):
+        return lane_progress(vehicle), self.spawn_order[vehicle]
+        
+    def add(self, vehicle):
+        self.spawn_order[vehicle] = self.spawned
+        self.spawned += 1
+        queue = self.lanes.setdefault(lane_key(vehicle), [])
+        bisect.insort(queue, vehicle, key=self._sort_key)
+        
+    def remove(self, vehicle):
+        queue = self.lanes[lane_key(vehicle)]
+        if queue[-1] is vehicle:
+            queue.pop()  # The usual case: the lane head drives off screen
+        else:
+            queue.remove(vehicle)
+        del self.spawn_order[vehicle]
+            
+    def clear(self):
+        self.lanes.clear()
+        self.spawn_order.clear()
+        
+    def leader_gaps(self):
+        """Map each vehicle with a leader to (gap, leader speed)"""
+        gaps = {}
+        for queue in self.lanes.values():
+            queue.sort(key=self._sort_key)
+            for follower, leader in zip(queue, queue[1:]):
+                gaps[follower] = (lane_gap(follower, leader), leader.speed)
+        return gaps
+
+# Lightweight stand-in for a Vehicle, handed to EmergencySystem by VehicleFleet
+FleetVehicle = namedtuple("FleetVehicle", ["x", "y", "direction", "vehicle_type"])
+
+class VehicleFleet:
+    """Struct-of-arrays vehicle state updated in one vectorized step
+    
+    Alternative to a list of Vehicle objects for large headless runs. Holds
+    no sprites; movement, red-light stops and the emergency speed boost
+    follow Vehicle.update exactly. Assumes intersections along a road are at
+    least APPROACH_DISTANCE apart, which the 80 px road width guarantees.
+    """
+    # Unit movement per direction: 0=right, 1=down, 2=left, 3=up
+    DX = np.array([1, 0, -1, 0], dtype=np.float64)
+    DY = np.array([0, 1, 0, -1], dtype=np.float64)
+    
+    def __init__(self, capacity=1024):
+        self.n = 0
+        self.x = np.zeros(capacity, dtype=np.float64)
+        self.y = np.zeros(capacity, dtype=np.float64)
+        self.direction = np.zeros(capacity, dtype=np.int8)
+        self.speed = np.zeros(capacity, dtype=np.float64)
+        self.original_speed = np.zeros(capacity, dtype=np.float64)
+        self.vehicle_type = np.zeros(capacity, dtype=np.int8)
+        self.length = np.zeros(capacity, dtype=np.float64)
+        self.delay_frames = np.zeros(capacity, dtype=np.float64)
+        self.stopped = np.zeros(capacity, dtype=bool)
+        self.emergency_mode = np.zeros(capacity, dtype=bool)
+        self._light_index_for = None
+        
+    _FIELDS = ("x", "y", "direction", "speed", "original_speed",
+               "vehicle_type", "length", "delay_frames", "stopped", "emergency_mode")
+    
+    def __len__(self):
+        return self.n
+        
+    def _grow(self):
+        for name in self._FIELDS:
+            old = getattr(self, name)
+            new = np.zeros(len(old) * 2, dtype=old.dtype)
+            new[:self.n] = old[:self.n]
+            setattr(self, name, new)
+            
+    def add(self, x, y, direction, vehicle_type=VehicleType.CAR):
+        if self.n == len(self.x):
+            self._grow()
+        i = self.n
+        self.x[i] = x
+        self.y[i] = y
+        self.direction[i] = direction
+        self.speed[i] = self.original_speed[i] = VEHICLE_SPEEDS[vehicle_type]
+        self.vehicle_type[i] = vehicle_type.value
+        self.length[i] = VEHICLE_SPRITES[vehicle_type][1][0]
+        self.delay_frames[i] = 0
+        self.stopped[i] = False
+        self.emergency_mode[i] = False
+        self.n += 1
+        
+    def clear(self):
+        self.n = 0
+        
+    def _is_emergency(self):
+        vehicle_type = self.vehicle_type[:self.n]
+        return ((vehicle_type == VehicleType.AMBULANCE.value) |
+                (vehicle_type == VehicleType.POLICE.value))
+        
+    def emergency_vehicles(self):
+        """FleetVehicle views of the (few) emergency vehicles"""
+        return [FleetVehicle(float(self.x[i]), float(self.y[i]), int(self.direction[i]),
+                             VehicleType(int(self.vehicle_type[i])))
+                for i in np.flatnonzero(self._is_emergency())]
+        
+    def _build_light_index(self, light_grid):
+        """Index lights by their position along the road grid axes"""
+        lights = light_grid.lights
+        self.light_xs = np.array(sorted({light.x for light in lights}), dtype=np.float64)
+        self.light_ys = np.array(sorted({light.y for light in lights}), dtype=np.float64)
+        col = {x: c for c, x in enumerate(self.light_xs.tolist())}
+        row = {y: r for r, y in enumerate(self.light_ys.tolist())}
+        # Pad with a trailing -1 row/column so out-of-range lookups land on "no light"
+        self.light_at = np.full((len(row) + 1, len(col) + 1), -1, dtype=np.int64)
+        for i, light in enumerate(lights):
+            self.light_at[row[light.y], col[light.x]] = i
+        self._light_index_for = light_grid
+        
+    @staticmethod
+    def _nearest_line(lines, values):
+        """Index of the road line within LANE_HALF_WIDTH of each value, or -1"""
+        idx = np.searchsorted(lines, values)
+        lo = np.clip(idx - 1, 0, len(lines) - 1)
+        hi = np.clip(idx, 0, len(lines) - 1)
+        nearest = np.where(np.abs(values - lines[lo]) <= np.abs(values - lines[hi]), lo, hi)
+        return np.where(np.abs(values - lines[nearest]) < LANE_HALF_WIDTH, nearest, -1)
+        
+    def _red_ahead(self, light_grid, x, y, direction):
+        """Vectorized Vehicle.check_traffic_light_collision"""
+        if self._light_index_for is not light_grid:
+            self._build_light_index(light_grid)
+        xs, ys = self.light_xs, self.light_ys
+        horizontal = (direction == 0) | (direction == 2)
+        forward = (direction == 0) | (direction == 1)
+        
+        # Lateral: which road the vehicle is on. Longitudinal: next light line ahead
+        lateral = np.where(horizontal,
+                           self._nearest_line(ys, y),
+                           self._nearest_line(xs, x))
+        along, lines = np.where(horizontal, x, y), np.where(horizontal, len(xs), len(ys))
+        ahead = np.where(horizontal,
+                         np.where(forward, np.searchsorted(xs, x, side="right"),
+                                  np.searchsorted(xs, x, side="left") - 1),
+                         np.where(forward, np.searchsorted(ys, y, side="right"),
+                                  np.searchsorted(ys, y, side="left") - 1))
+        in_range = (ahead >= 0) & (ahead < lines) & (lateral >= 0)
+        ahead = np.where(in_range, ahead, -1)
+        line_pos = np.where(horizontal,
+                            xs[np.clip(ahead, 0, len(xs) - 1)],
+                            ys[np.clip(ahead, 0, len(ys) - 1)])
+        in_range &= np.where(forward,
+                             line_pos - APPROACH_DISTANCE < along,
+                             along < line_pos + APPROACH_DISTANCE)
+        
+        light = np.empty(len(x), dtype=np.int64)
+        light[horizontal] = self.light_at[lateral[horizontal], ahead[horizontal]]
+        light[~horizontal] = self.light_at[ahead[~horizontal], lateral[~horizontal]]
+        light[~in_range] = -1
+        
+        lights = light_grid.lights
+        ns_red = np.array([l.ns_state == TrafficLightState.RED for l in lights] + [False])
+        ew_red = np.array([l.ew_state == TrafficLightState.RED for l in lights] + [False])
+        return np.where(horizontal, ew_red[light], ns_red[light])
+        
+    def _leader_gaps(self, x, y, direction):
+        """Vectorized LaneQueues.leader_gaps: one sort groups lanes and orders them"""
+        n = self.n
+        horizontal = (direction == 0) | (direction == 2)
+        lateral = np.where(horizontal, y, x)
+        progress = np.where(direction == 0, x,
+                   np.where(direction == 1, y,
+                   np.where(direction == 2, -x, -y)))
+        order = np.lexsort((progress, lateral, direction))
+        same_lane = ((direction[order[1:]] == direction[order[:-1]]) &
+                     (lateral[order[1:]] == lateral[order[:-1]]))
+        leader = np.full(n, -1, dtype=np.intp)
+        leader[order[:-1][same_lane]] = order[1:][same_lane]
+        
+        has_leader = leader >= 0
+        safe_leader = np.where(has_leader, leader, 0)
+        forward = (direction == 0) | (direction == 1)
+        body = np.where(forward, self.length[:n], self.length[:n][safe_leader])
+        gap = progress[safe_leader] - progress - body
+        return has_leader, gap, self.speed[:n][safe_leader]
+        
+    @staticmethod
+    def _idm_speed(speed, desired_speed, gap, leader_speed):
+        """Vectorized idm_speed, with the same arithmetic order"""
+        closing_speed = speed - leader_speed
+        desired_gap = IDM_MIN_GAP + np.maximum(0.0, speed * IDM_TIME_HEADWAY + speed * closing_speed / IDM_BRAKE_TERM)
+        free_ratio = speed / desired_speed
+        free_ratio *= free_ratio
+        with np.errstate(divide="ignore", invalid="ignore"):
+            gap_ratio = desired_gap / gap
+        accel = IDM_MAX_ACCEL * (1 - free_ratio * free_ratio - gap_ratio * gap_ratio)
+        new_speed = np.minimum(desired_speed, np.maximum(0.0, speed + accel))
+        return np.where(gap > 0, new_speed, 0.0)
+        
+    def update(self, light_grid, emergency_active):
+        """Vectorized Vehicle.update for every vehicle in the fleet"""
+        n = self.n
+        if n == 0:
+            return
+        x, y = self.x[:n], self.y[:n]
+        direction = self.direction[:n].astype(np.intp)
+        
+        emergency_mode = self._is_emergency() & emergency_active
+        self.emergency_mode[:n] = emergency_mode
+        stop = self._red_ahead(light_grid, x, y, direction) & ~emergency_mode
+        
+        speed_multiplier = np.where(emergency_mode, 1.5, 1.0)
+        desired_speed = self.original_speed[:n] * speed_multiplier
+        
+        # Follow the leader, except emergency vehicles which traffic yields to
+        has_leader, gap, leader_speed = self._leader_gaps(x, y, direction)
+        follow = has_leader & ~emergency_mode
+        speed = np.where(follow,
+                         self._idm_speed(self.speed[:n], desired_speed, gap, leader_speed),
+                         desired_speed)
+        speed = np.where(stop, 0.0, speed)
+        self.speed[:n] = speed
+        self.stopped[:n] = speed == 0
+        self.delay_frames[:n] += 1 - speed / self.original_speed[:n]
+        
+        # Move vehicles
+        x += self.DX[direction] * speed
+        y += self.DY[direction] * speed
+        
+    def remove_off_screen(self, width=SCREEN_WIDTH, height=SCREEN_HEIGHT):
+        """Drop vehicles that left the screen; return the delay_frames of the regular traffic among them"""
+        n = self.n
+        x, y = self.x[:n], self.y[:n]
+        off = ((x < -100) | (x > width + 100) |
+               (y < -100) | (y > height + 100))
+        if not off.any():
+            return self.delay_frames[:0]
+        cleared = self.delay_frames[:n][off & ~self._is_emergency()]
+        keep = ~off
+        self.n = int(np.count_nonzero(keep))
+        for name in self._FIELDS:
+            array = getattr(self, name)
+            array[:self.n] = array[:n][keep]
+        return cleared
+
+def draw_road_network(screen, road_x_positions=ROAD_X_POSITIONS, road_y_positions=ROAD_Y_POSITIONS):
     """Draw pixelated road network with details"""
     # Main horizontal roads
-    road_y_positions = [200, 350, 500, 650]
     for y in road_y_positions:
         # Road surface
         pygame.draw.rect(screen, ROAD_GRAY, (0, y - 40, SCREEN_WIDTH, 80))
@@ -385,7 +817,6 @@ def draw_road_network(screen):
             pygame.draw.rect(screen, YELLOW_LINE, (x, y - 2, 20, 4))
     
     # Main vertical roads
-    road_x_positions = [300, 500, 700, 900]
     for x in road_x_positions:
         # Road surface
         pygame.draw.rect(screen, ROAD_GRAY, (x - 40, 0, 80, SCREEN_HEIGHT))
@@ -426,8 +857,54 @@ def draw_road_network(screen):
     pygame.draw.rect(screen, CONCRETE, (0, 160, 260, 530))  # Left
     pygame.draw.rect(screen, CONCRETE, (940, 160, 460, 530))  # Right
 
+# Static layers keyed by (kind, ...layout); one layout per kind is live at a time
+_static_layers = {}
+
+def _cached_layer(key, build):
+    layer = _static_layers.get(key)
+    if layer is None:
+        layer = build()
+        if pygame.display.get_surface() is not None:
+            layer = layer.convert()  # Match the display format for fast blits
+        # The road layout changed: drop the stale layer of the same kind
+        for stale in [k for k in _static_layers if k[0] == key[0]]:
+            del _static_layers[stale]
+        _static_layers[key] = layer
+    return layer
+
+def get_static_background(road_x_positions=ROAD_X_POSITIONS, road_y_positions=ROAD_Y_POSITIONS):
+    """Grass, roads and buildings, rendered once per road layout"""
+    def build():
+        background = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        background.fill(DARK_GREEN)  # Grass background
+        draw_road_network(background, road_x_positions, road_y_positions)
+        return background
+    key = ("background", tuple(road_x_positions), tuple(road_y_positions))
+    return _cached_layer(key, build)
+
+def get_minimap_base(size, road_x_positions=ROAD_X_POSITIONS, road_y_positions=ROAD_Y_POSITIONS):
+    """Minimap background, border and roads, rendered once per road layout"""
+    def build():
+        base = pygame.Surface((size, size))
+        base.fill((40, 40, 40))
+        pygame.draw.rect(base, WHITE, (0, 0, size, size), 2)
+        
+        # Scale factor for minimap
+        scale_x = size / SCREEN_WIDTH
+        scale_y = size / SCREEN_HEIGHT
+        for x in road_x_positions:
+            mini_x = int(x * scale_x)
+            pygame.draw.line(base, ROAD_GRAY, (mini_x, 0), (mini_x, size), 2)
+        for y in road_y_positions:
+            mini_y = int(y * scale_y)
+            pygame.draw.line(base, ROAD_GRAY, (0, mini_y), (size, mini_y), 2)
+        return base
+    key = ("minimap", size, tuple(road_x_positions), tuple(road_y_positions))
+    return _cached_layer(key, build)
+
 class EmergencySystem:
-    def __init__(self):
+    def __init__(self, get_ticks=pygame.time.get_ticks):
+        self.get_ticks = get_ticks
         self.emergency_active = False
         self.ambulance_detected = False
         self.detection_radius = 200
@@ -435,7 +912,7 @@ class EmergencySystem:
         self.cleared_intersections = set()
         self.siren_sound_radius = 0
         
-    def detect_ambulance(self, vehicles, traffic_lights):
+    def detect_ambulance(self, vehicles, light_grid):
         emergency_vehicles = [v for v in vehicles if v.vehicle_type in [VehicleType.AMBULANCE, VehicleType.POLICE]]
         
         if not emergency_vehicles and self.emergency_active:
@@ -447,23 +924,28 @@ class EmergencySystem:
         min_distance = float('inf')
         
         for vehicle in emergency_vehicles:
-            for i, light in enumerate(traffic_lights):
-                distance = math.sqrt((vehicle.x - light.x)**2 + (vehicle.y - light.y)**2)
-                if distance < self.detection_radius:
-                    if not self.emergency_active:
-                        self.emergency_active = True
-                        self.alert_start_time = pygame.time.get_ticks()
-                        
-                    if distance < min_distance:
-                        min_distance = distance
-                        closest_emergency = vehicle
-                        
-                    if i not in self.cleared_intersections:
-                        light.clear_for_ambulance(vehicle.direction)
-                        self.cleared_intersections.add(i)
-                        
+            for i, light, distance in light_grid.lights_within(vehicle.x, vehicle.y, self.detection_radius):
+                if not self.emergency_active:
+                    self.emergency_active = True
+                    self.alert_start_time = self.get_ticks()
+                    
+                if distance < min_distance:
+                    min_distance = distance
+                    closest_emergency = vehicle
+                    
+                if i not in self.cleared_intersections:
+                    light.clear_for_ambulance(vehicle.direction)
+                    self.cleared_intersections.add(i)
+                    
         return self.emergency_active, closest_emergency
         
+    def get_alert_rects(self):
+        """Screen areas draw_alerts paints: top banner and the two warning light columns"""
+        light_size = 20
+        return [pygame.Rect(0, 0, SCREEN_WIDTH, 70),
+                pygame.Rect(0, 0, light_size, SCREEN_HEIGHT),
+                pygame.Rect(SCREEN_WIDTH - light_size, 0, light_size, SCREEN_HEIGHT)]
+        
     def draw_alerts(self, screen, font):
         if self.emergency_active:
             # Animated emergency banner
@@ -476,7 +958,7 @@ class EmergencySystem:
             
             # Emergency text with pixel effect
             text = "🚨 EMERGENCY VEHICLE DETECTED - CLEARING TRAFFIC 🚨"
-            text_surface = font.render(text, True, WHITE)
+            text_surface = text_cache.render(font, text, True, WHITE)
             text_rect = text_surface.get_rect(center=(SCREEN_WIDTH//2, banner_height//2))
             screen.blit(text_surface, text_rect)
             
@@ -487,7 +969,340 @@ class EmergencySystem:
                 pygame.draw.rect(screen, color, (0, i, light_size, light_size))
                 pygame.draw.rect(screen, color, (SCREEN_WIDTH - light_size, i, light_size, light_size))
 
-def main():
+def make_road_grid(columns=4, rows=4):
+    """Road positions and world size for a columns x rows intersection grid
+    
+    4 x 4 reproduces the default layout on the 1400 x 900 screen.
+    """
+    road_x_positions = [300 + 200 * i for i in range(columns)]
+    road_y_positions = [200 + 150 * j for j in range(rows)]
+    return road_x_positions, road_y_positions, road_x_positions[-1] + 500, road_y_positions[-1] + 250
+
+class SimClock:
+    """Simulated millisecond clock, a drop-in for pygame.time.get_ticks"""
+    def __init__(self, start=0):
+        self.ticks = start
+        
+    def get_ticks(self):
+        return self.ticks
+        
+    def advance(self, ms=STEP_MS):
+        self.ticks += ms
+
+class Simulation:
+    """Traffic world state and the per-frame update, independent of rendering
+    
+    All randomness comes from `seed`, so a run on a SimClock is reproducible.
+    Passing an `event_log` (anything with record(frame, kind, *fields))
+    captures spawns, light phase changes and emergency activations. A
+    spawn interval of None disables that spawn timer.
+    """
+    def __init__(self, get_ticks=pygame.time.get_ticks, seed=None,
+                 regular_spawn_interval=3000, emergency_spawn_interval=None,
+                 road_x_positions=ROAD_X_POSITIONS, road_y_positions=ROAD_Y_POSITIONS,
+                 world_width=SCREEN_WIDTH, world_height=SCREEN_HEIGHT,
+                 green_interval=4000, fleet_backend="objects", event_log=None):
+        self.get_ticks = get_ticks
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.rng = random.Random(self.seed)
+        self.frame = 0
+        self.event_log = event_log
+        self.road_x_positions = list(road_x_positions)
+        self.road_y_positions = list(road_y_positions)
+        self.world_width = world_width
+        self.world_height = world_height
+        
+        # Create traffic lights at intersections
+        self.traffic_lights = []
+        for x in self.road_x_positions:
+            for y in self.road_y_positions:
+                self.traffic_lights.append(TrafficLight(x, y, get_ticks, green_interval))
+        self.light_grid = LightGrid(self.traffic_lights)
+        self.light_states = [(light.ns_state, light.ew_state) for light in self.traffic_lights]
+        
+        # "objects" keeps a list of Vehicle; "numpy" uses a sprite-less VehicleFleet
+        self.vehicles = []
+        self.fleet = VehicleFleet() if fleet_backend == "numpy" else None
+        self.lane_queues = LaneQueues()
+        self.emergency_system = EmergencySystem(get_ticks)
+        self.emergency_active = False
+        
+        # Spawn timers
+        self.last_regular_spawn = get_ticks()
+        self.last_emergency_spawn = get_ticks()
+        self.regular_spawn_interval = regular_spawn_interval
+        self.emergency_spawn_interval = emergency_spawn_interval
+        
+        # Statistics
+        self.vehicles_cleared = 0
+        self.emergency_activations = 0
+        self.total_spawned = 0
+        self.total_delay_ms = 0
+        self.emergency_started = None
+        self.emergency_clearance_ms = []
+        
+    def spawn_vehicle(self, vehicle_type, margin=0):
+        """Spawn a vehicle on a random edge, `margin` pixels inside the screen"""
+        spawn_side = self.rng.randint(0, 3)
+        if spawn_side == 0:  # Left
+            x, y = margin, self.rng.choice(self.road_y_positions)
+        elif spawn_side == 1:  # Top
+            x, y = self.rng.choice(self.road_x_positions), margin
+        elif spawn_side == 2:  # Right
+            x, y = self.world_width - margin, self.rng.choice(self.road_y_positions)
+        else:  # Bottom
+            x, y = self.rng.choice(self.road_x_positions), self.world_height - margin
+        return self.add_vehicle(x, y, spawn_side, vehicle_type)
+        
+    def add_vehicle(self, x, y, direction, vehicle_type):
+        self.total_spawned += 1
+        self._record(event_log.SPAWN, x, y, direction, vehicle_type.value)
+        
+        if self.fleet is not None:
+            self.fleet.add(x, y, direction, vehicle_type)
+            return None
+        vehicle = Vehicle(x, y, direction, vehicle_type)
+        self.vehicles.append(vehicle)
+        self.lane_queues.add(vehicle)
+        return vehicle
+        
+    def spawn_emergency(self, vehicle_type=VehicleType.AMBULANCE):
+        return self.spawn_vehicle(vehicle_type, margin=50)
+        
+    def _record(self, kind, *fields):
+        if self.event_log is not None:
+            self.event_log.record(self.frame, kind, *fields)
+            
+    def clear_vehicles(self):
+        self._record(event_log.CLEAR)
+        self.vehicles.clear()
+        self.lane_queues.clear()
+        if self.fleet is not None:
+            self.fleet.clear()
+            
+    def vehicle_count(self):
+        return len(self.fleet) if self.fleet is not None else len(self.vehicles)
+        
+    def reset_statistics(self):
+        self._record(event_log.RESET)
+        self.vehicles_cleared = 0
+        self.emergency_activations = 0
+        self.total_spawned = 0
+        self.total_delay_ms = 0
+        self.emergency_clearance_ms = []
+        
+    def step(self):
+        """Advance the world by one frame at the current clock time"""
+        current_time = self.get_ticks()
+        
+        # Spawn regular vehicles
+        if (self.regular_spawn_interval is not None and
+                current_time - self.last_regular_spawn > self.regular_spawn_interval):
+            vehicle_types = [VehicleType.CAR, VehicleType.CAR, VehicleType.CAR, VehicleType.TRUCK]
+            self.spawn_vehicle(self.rng.choice(vehicle_types))
+            self.last_regular_spawn = current_time
+            
+        # Spawn emergency vehicles on a timer (keyboard only when disabled)
+        if (self.emergency_spawn_interval is not None and
+                current_time - self.last_emergency_spawn > self.emergency_spawn_interval):
+            self.spawn_emergency(self.rng.choice([VehicleType.AMBULANCE, VehicleType.POLICE]))
+            self.last_emergency_spawn = current_time
+            
+        # Update emergency system
+        emergency_system = self.emergency_system
+        vehicles = self.fleet.emergency_vehicles() if self.fleet is not None else self.vehicles
+        emergency_active, closest_emergency = emergency_system.detect_ambulance(vehicles, self.light_grid)
+        self.emergency_active = emergency_active
+        
+        if emergency_active and not emergency_system.ambulance_detected:
+            self.emergency_activations += 1
+            self.emergency_started = current_time
+            emergency_system.ambulance_detected = True
+            self._record(event_log.EMERGENCY, 1)
+        elif not emergency_active:
+            if emergency_system.ambulance_detected:
+                self._record(event_log.EMERGENCY, 0)
+                if self.emergency_started is not None:
+                    self.emergency_clearance_ms.append(current_time - self.emergency_started)
+            emergency_system.ambulance_detected = False
+            
+        # Update traffic lights
+        ambulance_direction = closest_emergency.direction if closest_emergency else None
+        for light in self.traffic_lights:
+            light.update(emergency_active, ambulance_direction)
+        if self.event_log is not None:
+            self._record_light_changes()
+            
+        # Update vehicles
+        if self.fleet is not None:
+            self.fleet.update(self.light_grid, emergency_active)
+            delays = self.fleet.remove_off_screen(self.world_width, self.world_height)
+            self.vehicles_cleared += len(delays)
+            self.total_delay_ms += float(delays.sum()) * STEP_MS
+        else:
+            self._update_vehicles(emergency_active)
+        self.frame += 1
+        
+    def _record_light_changes(self):
+        for i, light in enumerate(self.traffic_lights):
+            state = (light.ns_state, light.ew_state)
+            if state != self.light_states[i]:
+                self.light_states[i] = state
+                self._record(event_log.LIGHT, i, light.ns_state.value, light.ew_state.value)
+                
+    def _update_vehicles(self, emergency_active):
+        # Leaders are measured before anyone moves, so update order doesn't matter
+        leader_gaps = self.lane_queues.leader_gaps()
+        for vehicle in self.vehicles[:]:
+            gap, leader_speed = leader_gaps.get(vehicle, (None, None))
+            vehicle.update(self.light_grid, emergency_active and 
+                         vehicle.vehicle_type in [VehicleType.AMBULANCE, VehicleType.POLICE],
+                         gap, leader_speed)
+            if vehicle.is_off_screen(self.world_width, self.world_height):
+                self.vehicles.remove(vehicle)
+                self.lane_queues.remove(vehicle)
+                if vehicle.vehicle_type in [VehicleType.CAR, VehicleType.TRUCK]:
+                    self.vehicles_cleared += 1
+                    self.total_delay_ms += vehicle.delay_frames * STEP_MS
+                    
+    def statistics(self):
+        return {
+            "seed": self.seed,
+            "sim_time_s": round(self.get_ticks() / 1000, 3),
+            "vehicles": self.vehicle_count(),
+            "vehicles_cleared": self.vehicles_cleared,
+            "emergency_activations": self.emergency_activations,
+            "total_spawned": self.total_spawned,
+            "mean_delay_s": round(self.total_delay_ms / max(self.vehicles_cleared, 1) / 1000, 3),
+            "mean_emergency_clearance_s": round(
+                sum(self.emergency_clearance_ms) / max(len(self.emergency_clearance_ms), 1) / 1000, 3),
+        }
+
+class EventReplay:
+    """Re-executes a recorded run against a Simulation
+    
+    Logged inputs (spawns, clears, resets) are fed back in before the frame
+    they were recorded at. Every event the replay produces, including light
+    phase changes and emergency activations, is checked against the log;
+    the first divergence is kept in `mismatch`.
+    """
+    def __init__(self, path):
+        self.seed, self.config, self.events = event_log.read_event_log(path)
+        self.end_frame = None
+        if self.events and self.events[-1][1] == event_log.END:
+            self.end_frame = self.events.pop()[0]
+        self.inputs = {}
+        for frame, kind, fields in self.events:
+            if kind in event_log.INPUT_EVENTS:
+                self.inputs.setdefault(frame, []).append((kind, fields))
+        self.position = 0
+        self.mismatch = None
+        
+    def create_simulation(self, get_ticks):
+        # Spawns come from the log, so the simulation's own spawn timers are disabled
+        config = dict(self.config, regular_spawn_interval=None, emergency_spawn_interval=None)
+        return Simulation(get_ticks=get_ticks, seed=self.seed, event_log=self, **config)
+        
+    def apply_inputs(self, sim):
+        """Feed in the inputs recorded before the next frame"""
+        for kind, fields in self.inputs.pop(sim.frame, ()):
+            if kind == event_log.SPAWN:
+                x, y, direction, vehicle_type = fields
+                sim.add_vehicle(x, y, direction, VehicleType(vehicle_type))
+            elif kind == event_log.CLEAR:
+                sim.clear_vehicles()
+            elif kind == event_log.RESET:
+                sim.reset_statistics()
+                
+    def record(self, frame, kind, *fields):
+        """Event sink for the replaying Simulation"""
+        if self.mismatch is None:
+            expected = self.events[self.position] if self.position < len(self.events) else None
+            if expected != (frame, kind, fields):
+                self.mismatch = {"expected": expected, "replayed": (frame, kind, fields)}
+        self.position += 1
+        
+    def finished(self, sim):
+        return self.end_frame is not None and sim.frame >= self.end_frame
+        
+    def check_complete(self):
+        """Count a replay that stopped before the end of the log as a mismatch"""
+        if self.mismatch is None and self.position != len(self.events):
+            self.mismatch = {"expected": self.events[self.position], "replayed": None}
+
+def run_headless(duration_s, seed=None, record_path=None, **sim_kwargs):
+    """Run the simulation on a fixed timestep with no rendering, as fast as possible"""
+    clock = SimClock()
+    sim = Simulation(get_ticks=clock.get_ticks, seed=seed, **sim_kwargs)
+    if record_path:
+        sim.event_log = event_log.EventLogWriter(record_path, sim.seed, sim_kwargs)
+    try:
+        for _ in range(round(duration_s * 1000 / STEP_MS)):
+            clock.advance()
+            sim.step()
+    finally:
+        # Even a failed run leaves a readable log, ending at the last completed frame
+        if record_path:
+            sim.event_log.close(sim.frame)
+    return sim.statistics()
+
+def replay_headless(path):
+    """Re-execute a recorded run with no rendering; returns (statistics, mismatch)"""
+    replay = EventReplay(path)
+    clock = SimClock()
+    sim = replay.create_simulation(clock.get_ticks)
+    while not replay.finished(sim):
+        replay.apply_inputs(sim)
+        clock.advance()
+        sim.step()
+    replay.check_complete()
+    return sim.statistics(), replay.mismatch
+
+class DirtyRectTracker:
+    """Collects the screen areas that changed since the last display update
+    
+    Drawables are tracked by key with their rect and a draw-state value; a
+    key is dirty when either changed, and keys that disappear dirty their
+    last rect. The frame is still composed in full off-screen, only the
+    dirty areas are pushed with pygame.display.update.
+    """
+    def __init__(self, screen_rect, max_rects=64):
+        self.screen_rect = pygame.Rect(screen_rect)
+        self.max_rects = max_rects
+        self.previous = {}
+        self.current = {}
+        self.dirty = [self.screen_rect.copy()]  # First frame pushes everything
+        
+    def add(self, rect):
+        """Mark an area dirty unconditionally"""
+        self.dirty.append(pygame.Rect(rect))
+        
+    def track(self, key, rect, state=None):
+        rect = pygame.Rect(rect)
+        self.current[key] = (rect, state)
+        last = self.previous.get(key)
+        if last is None:
+            self.dirty.append(rect)
+        elif last[0] != rect or last[1] != state:
+            self.dirty.append(last[0])
+            self.dirty.append(rect)
+            
+    def flush(self):
+        """Return this frame's dirty rects, clipped to the screen, and start a new frame"""
+        for key, (rect, _) in self.previous.items():
+            if key not in self.current:
+                self.dirty.append(rect)
+        self.previous, self.current = self.current, {}
+        
+        dirty = [rect.clip(self.screen_rect) for rect in self.dirty]
+        dirty = [rect for rect in dirty if rect.width and rect.height]
+        self.dirty = []
+        if len(dirty) > self.max_rects:
+            # Past this many rects one bounding update is cheaper
+            dirty = [dirty[0].unionall(dirty[1:])]
+        return dirty
+
+def main(dirty_rects=False, seed=None, record_path=None, replay_path=None):
     screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
     pygame.display.set_caption("Pixelated Ambulance Traffic System")
     clock = pygame.time.Clock()
@@ -496,272 +1311,281 @@ def main():
     font = pygame.font.Font(None, 36)
     small_font = pygame.font.Font(None, 24)
     
-    # Create traffic lights at intersections
-    traffic_lights = []
-    road_x_positions = [300, 500, 700, 900]
-    road_y_positions = [200, 350, 500, 650]
+    # The simulation runs on its own clock, one step per unpaused frame, so a
+    # seeded or replayed run does not depend on the display's frame rate
+    sim_clock = SimClock()
+    replay = None
+    if replay_path:
+        replay = EventReplay(replay_path)
+        sim = replay.create_simulation(sim_clock.get_ticks)
+    else:
+        sim = Simulation(get_ticks=sim_clock.get_ticks, seed=seed)
+        if record_path:
+            sim.event_log = event_log.EventLogWriter(record_path, sim.seed)
+    print(f"Seed: {sim.seed}")
+    traffic_lights = sim.traffic_lights
+    road_x_positions = sim.road_x_positions
+    road_y_positions = sim.road_y_positions
+    emergency_system = sim.emergency_system
     
-    for x in road_x_positions:
-        for y in road_y_positions:
-            traffic_lights.append(TrafficLight(x, y))
-    
-    vehicles = []
-    emergency_system = EmergencySystem()
+    # Semi-transparent pause overlay, built once
+    pause_overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pause_overlay.set_alpha(128)
+    pause_overlay.fill(BLACK)
     
-    # Spawn timers
-    last_regular_spawn = pygame.time.get_ticks()
-    last_emergency_spawn = pygame.time.get_ticks()
-    regular_spawn_interval = 3000
-    
-    # Statistics
-    vehicles_cleared = 0
-    emergency_activations = 0
-    total_spawned = 0
+    # Dirty-rect mode pushes only changed areas and skips idle paused frames
+    tracker = DirtyRectTracker(screen.get_rect()) if dirty_rects else None
     
     running = True
     paused = False
     
-    while running:
-        current_time = pygame.time.get_ticks()
-        
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_SPACE:
-                    paused = not paused
-                elif event.key == pygame.K_a:
-                    # Spawn ambulance
-                    spawn_side = random.randint(0, 3)
-                    if spawn_side == 0:  # Left
-                        ambulance = Vehicle(50, random.choice(road_y_positions), 0, VehicleType.AMBULANCE)
-                    elif spawn_side == 1:  # Top
-                        ambulance = Vehicle(random.choice(road_x_positions), 50, 1, VehicleType.AMBULANCE)
-                    elif spawn_side == 2:  # Right
-                        ambulance = Vehicle(SCREEN_WIDTH - 50, random.choice(road_y_positions), 2, VehicleType.AMBULANCE)
-                    else:  # Bottom
-                        ambulance = Vehicle(random.choice(road_x_positions), SCREEN_HEIGHT - 50, 3, VehicleType.AMBULANCE)
-                    vehicles.append(ambulance)
-                    total_spawned += 1
-                elif event.key == pygame.K_p:
-                    # Spawn police
-                    spawn_side = random.randint(0, 3)
-                    if spawn_side == 0:  # Left
-                        police = Vehicle(50, random.choice(road_y_positions), 0, VehicleType.POLICE)
-                    elif spawn_side == 1:  # Top
-                        police = Vehicle(random.choice(road_x_positions), 50, 1, VehicleType.POLICE)
-                    elif spawn_side == 2:  # Right
-                        police = Vehicle(SCREEN_WIDTH - 50, random.choice(road_y_positions), 2, VehicleType.POLICE)
-                    else:  # Bottom
-                        police = Vehicle(random.choice(road_x_positions), SCREEN_HEIGHT - 50, 3, VehicleType.POLICE)
-                    vehicles.append(police)
-                    total_spawned += 1
-                elif event.key == pygame.K_c:
-                    vehicles.clear()
-                elif event.key == pygame.K_r:
-                    vehicles_cleared = 0
-                    emergency_activations = 0
-                    total_spawned = 0
-                    
-        if not paused:
-            # Spawn regular vehicles
-            if current_time - last_regular_spawn > regular_spawn_interval:
-                vehicle_types = [VehicleType.CAR, VehicleType.CAR, VehicleType.CAR, VehicleType.TRUCK]
-                vehicle_type = random.choice(vehicle_types)
+    try:
+        while running:
+            scene_changed = not paused
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+                elif event.type == pygame.KEYDOWN:
+                    scene_changed = True
+                    if event.key == pygame.K_SPACE:
+                        paused = not paused
+                        if tracker:
+                            tracker.add(screen.get_rect())  # Pause overlay covers everything
+                    elif replay:
+                        pass  # A replay takes its inputs from the log
+                    elif event.key == pygame.K_a:
+                        sim.spawn_emergency(VehicleType.AMBULANCE)
+                    elif event.key == pygame.K_p:
+                        sim.spawn_emergency(VehicleType.POLICE)
+                    elif event.key == pygame.K_c:
+                        sim.clear_vehicles()
+                    elif event.key == pygame.K_r:
+                        sim.reset_statistics()
+                        
+            if replay and replay.finished(sim):
+                paused = True
+            if not paused:
+                if replay:
+                    replay.apply_inputs(sim)
+                sim_clock.advance()
+                sim.step()
                 
-                spawn_side = random.randint(0, 3)
-                if spawn_side == 0:  # Left
-                    new_vehicle = Vehicle(0, random.choice(road_y_positions), 0, vehicle_type)
-                elif spawn_side == 1:  # Top  
-                    new_vehicle = Vehicle(random.choice(road_x_positions), 0, 1, vehicle_type)
-                elif spawn_side == 2:  # Right
-                    new_vehicle = Vehicle(SCREEN_WIDTH, random.choice(road_y_positions), 2, vehicle_type)
-                else:  # Bottom
-                    new_vehicle = Vehicle(random.choice(road_x_positions), SCREEN_HEIGHT, 3, vehicle_type)
-                    
-                vehicles.append(new_vehicle)
-                total_spawned += 1
-                last_regular_spawn = current_time
+            if tracker and not scene_changed:
+                # Paused with no input: nothing on screen can have changed
+                clock.tick(FPS)
+                continue
+                
+            vehicles = sim.vehicles
+            emergency_active = sim.emergency_active
+            
+            # Draw everything, starting from the cached grass/road/building layer
+            screen.blit(get_static_background(road_x_positions, road_y_positions), (0, 0))
+            
+            # Draw traffic lights
+            for light in traffic_lights:
+                light.draw(screen)
                 
-            # Update emergency system
-            emergency_active, closest_emergency = emergency_system.detect_ambulance(vehicles, traffic_lights)
-            
-            if emergency_active and not emergency_system.ambulance_detected:
-                emergency_activations += 1
-                emergency_system.ambulance_detected = True
-            elif not emergency_active:
-                emergency_system.ambulance_detected = False
+            # Draw vehicles (sorted by y-position for proper layering)
+            vehicles_sorted = sorted(vehicles, key=lambda v: v.y)
+            for vehicle in vehicles_sorted:
+                vehicle.draw(screen)
                 
-            # Update traffic lights
+            # Draw emergency alerts
+            emergency_system.draw_alerts(screen, font)
+            
+            # Draw pixelated UI panel
+            ui_panel_height = 200
+            pygame.draw.rect(screen, (20, 20, 20), (0, SCREEN_HEIGHT - ui_panel_height, SCREEN_WIDTH, ui_panel_height))
+            pygame.draw.rect(screen, WHITE, (0, SCREEN_HEIGHT - ui_panel_height, SCREEN_WIDTH, 4))
+            
+            # UI Information with pixel styling
+            info_texts = [
+                f"🚗 Total Vehicles: {len(vehicles)}",
+                f"🚑 Emergency Active: {'YES' if emergency_active else 'NO'}",
+                f"✅ Vehicles Cleared: {sim.vehicles_cleared}",
+                f"🚨 Emergency Calls: {sim.emergency_activations}",
+                f"📊 Total Spawned: {sim.total_spawned}",
+            ]
+            
+            controls_texts = [
+                "CONTROLS:",
+                "SPACE - Pause/Resume",
+                "A - Spawn Ambulance 🚑",
+                "P - Spawn Police 👮",
+                "C - Clear All Vehicles",
+                "R - Reset Statistics"
+            ]
+            
+            # Left column - Statistics
+            y_offset = SCREEN_HEIGHT - ui_panel_height + 10
+            info_flash = (pygame.time.get_ticks() // 500) % 2 if emergency_active else None
+            for i, text in enumerate(info_texts):
+                color = EMERGENCY_RED if "Emergency Active: YES" in text else WHITE
+                if "Emergency Active" in text and emergency_active:
+                    # Flashing effect for active emergency
+                    if info_flash:
+                        color = YELLOW
+                rendered_text = text_cache.render(small_font, text, True, color)
+                screen.blit(rendered_text, (20, y_offset))
+                y_offset += 25
+                
+            # Right column - Controls
+            y_offset = SCREEN_HEIGHT - ui_panel_height + 10
+            for text in controls_texts:
+                color = YELLOW if text == "CONTROLS:" else LIGHT_BLUE
+                rendered_text = text_cache.render(small_font, text, True, color)
+                screen.blit(rendered_text, (SCREEN_WIDTH // 2 + 50, y_offset))
+                y_offset += 25
+                
+            # Draw mini-map in corner
+            minimap_size = 150
+            minimap_x = SCREEN_WIDTH - minimap_size - 20
+            minimap_y = SCREEN_HEIGHT - ui_panel_height - minimap_size - 20
+            
+            # Minimap background and roads (cached)
+            screen.blit(get_minimap_base(minimap_size, road_x_positions, road_y_positions), (minimap_x, minimap_y))
+            
+            # Minimap title
+            minimap_title = text_cache.render(small_font, "TRAFFIC MAP", True, WHITE)
+            screen.blit(minimap_title, (minimap_x + 5, minimap_y - 25))
+            
+            # Scale factor for minimap
+            scale_x = minimap_size / SCREEN_WIDTH
+            scale_y = minimap_size / SCREEN_HEIGHT
+            
+            # Draw vehicles on minimap
+            for vehicle in vehicles:
+                mini_x = int(vehicle.x * scale_x) + minimap_x
+                mini_y = int(vehicle.y * scale_y) + minimap_y
+                
+                if mini_x >= minimap_x and mini_x <= minimap_x + minimap_size and mini_y >= minimap_y and mini_y <= minimap_y + minimap_size:
+                    if vehicle.vehicle_type == VehicleType.AMBULANCE:
+                        color = RED if vehicle.emergency_mode else WHITE
+                    elif vehicle.vehicle_type == VehicleType.POLICE:
+                        color = BLUE
+                    elif vehicle.vehicle_type == VehicleType.TRUCK:
+                        color = ORANGE
+                    else:
+                        color = GREEN
+                        
+                    pygame.draw.circle(screen, color, (mini_x, mini_y), 2)
+            
+            # Draw traffic lights on minimap
             for light in traffic_lights:
-                ambulance_direction = closest_emergency.direction if closest_emergency else None
-                light.update(emergency_active, ambulance_direction)
+                mini_x = int(light.x * scale_x) + minimap_x
+                mini_y = int(light.y * scale_y) + minimap_y
                 
-            # Update vehicles
-            for vehicle in vehicles[:]:
-                vehicle.update(traffic_lights, emergency_active and 
-                             vehicle.vehicle_type in [VehicleType.AMBULANCE, VehicleType.POLICE])
-                if vehicle.is_off_screen():
-                    vehicles.remove(vehicle)
-                    if vehicle.vehicle_type in [VehicleType.CAR, VehicleType.TRUCK]:
-                        vehicles_cleared += 1
-        
-        # Draw everything
-        screen.fill(DARK_GREEN)  # Grass background
-        
-        # Draw road network
-        draw_road_network(screen)
-        
-        # Draw traffic lights
-        for light in traffic_lights:
-            light.draw(screen)
-            
-        # Draw vehicles (sorted by y-position for proper layering)
-        vehicles_sorted = sorted(vehicles, key=lambda v: v.y)
-        for vehicle in vehicles_sorted:
-            vehicle.draw(screen)
-            
-        # Draw emergency alerts
-        emergency_system.draw_alerts(screen, font)
-        
-        # Draw pixelated UI panel
-        ui_panel_height = 200
-        pygame.draw.rect(screen, (20, 20, 20), (0, SCREEN_HEIGHT - ui_panel_height, SCREEN_WIDTH, ui_panel_height))
-        pygame.draw.rect(screen, WHITE, (0, SCREEN_HEIGHT - ui_panel_height, SCREEN_WIDTH, 4))
-        
-        # UI Information with pixel styling
-        info_texts = [
-            f"🚗 Total Vehicles: {len(vehicles)}",
-            f"🚑 Emergency Active: {'YES' if emergency_active else 'NO'}",
-            f"✅ Vehicles Cleared: {vehicles_cleared}",
-            f"🚨 Emergency Calls: {emergency_activations}",
-            f"📊 Total Spawned: {total_spawned}",
-        ]
-        
-        controls_texts = [
-            "CONTROLS:",
-            "SPACE - Pause/Resume",
-            "A - Spawn Ambulance 🚑",
-            "P - Spawn Police 👮",
-            "C - Clear All Vehicles",
-            "R - Reset Statistics"
-        ]
-        
-        # Left column - Statistics
-        y_offset = SCREEN_HEIGHT - ui_panel_height + 10
-        for i, text in enumerate(info_texts):
-            color = EMERGENCY_RED if "Emergency Active: YES" in text else WHITE
-            if "Emergency Active" in text and emergency_active:
-                # Flashing effect for active emergency
-                if (pygame.time.get_ticks() // 500) % 2:
-                    color = YELLOW
-            rendered_text = small_font.render(text, True, color)
-            screen.blit(rendered_text, (20, y_offset))
-            y_offset += 25
-            
-        # Right column - Controls
-        y_offset = SCREEN_HEIGHT - ui_panel_height + 10
-        for text in controls_texts:
-            color = YELLOW if text == "CONTROLS:" else LIGHT_BLUE
-            rendered_text = small_font.render(text, True, color)
-            screen.blit(rendered_text, (SCREEN_WIDTH // 2 + 50, y_offset))
-            y_offset += 25
-            
-        # Draw mini-map in corner
-        minimap_size = 150
-        minimap_x = SCREEN_WIDTH - minimap_size - 20
-        minimap_y = SCREEN_HEIGHT - ui_panel_height - minimap_size - 20
-        
-        # Minimap background
-        pygame.draw.rect(screen, (40, 40, 40), (minimap_x, minimap_y, minimap_size, minimap_size))
-        pygame.draw.rect(screen, WHITE, (minimap_x, minimap_y, minimap_size, minimap_size), 2)
-        
-        # Minimap title
-        minimap_title = small_font.render("TRAFFIC MAP", True, WHITE)
-        screen.blit(minimap_title, (minimap_x + 5, minimap_y - 25))
-        
-        # Scale factor for minimap
-        scale_x = minimap_size / SCREEN_WIDTH
-        scale_y = minimap_size / SCREEN_HEIGHT
-        
-        # Draw roads on minimap
-        for x in road_x_positions:
-            mini_x = int(x * scale_x) + minimap_x
-            pygame.draw.line(screen, ROAD_GRAY, (mini_x, minimap_y), (mini_x, minimap_y + minimap_size), 2)
-        
-        for y in road_y_positions:
-            mini_y = int(y * scale_y) + minimap_y
-            pygame.draw.line(screen, ROAD_GRAY, (minimap_x, mini_y), (minimap_x + minimap_size, mini_y), 2)
-        
-        # Draw vehicles on minimap
-        for vehicle in vehicles:
-            mini_x = int(vehicle.x * scale_x) + minimap_x
-            mini_y = int(vehicle.y * scale_y) + minimap_y
-            
-            if mini_x >= minimap_x and mini_x <= minimap_x + minimap_size and mini_y >= minimap_y and mini_y <= minimap_y + minimap_size:
-                if vehicle.vehicle_type == VehicleType.AMBULANCE:
-                    color = RED if vehicle.emergency_mode else WHITE
-                elif vehicle.vehicle_type == VehicleType.POLICE:
-                    color = BLUE
-                elif vehicle.vehicle_type == VehicleType.TRUCK:
-                    color = ORANGE
+                if light.emergency_mode:
+                    color = EMERGENCY_RED
                 else:
-                    color = GREEN
-                    
-                pygame.draw.circle(screen, color, (mini_x, mini_y), 2)
-        
-        # Draw traffic lights on minimap
-        for light in traffic_lights:
-            mini_x = int(light.x * scale_x) + minimap_x
-            mini_y = int(light.y * scale_y) + minimap_y
+                    color = YELLOW
+                pygame.draw.circle(screen, color, (mini_x, mini_y), 3)
+                
+            # Performance indicator
+            fps_text = text_cache.render(small_font, f"FPS: {int(clock.get_fps())}", True, WHITE)
+            screen.blit(fps_text, (SCREEN_WIDTH - 100, 10))
             
-            if light.emergency_mode:
-                color = EMERGENCY_RED
+            # Draw pause overlay
+            if paused:
+                # Semi-transparent overlay
+                screen.blit(pause_overlay, (0, 0))
+                
+                # Pause text with pixelated border
+                pause_text = text_cache.render(font, "GAME PAUSED", True, YELLOW)
+                pause_rect = pause_text.get_rect(center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2))
+                
+                # Draw pixelated border
+                border_size = 10
+                pygame.draw.rect(screen, WHITE, pause_rect.inflate(border_size * 2, border_size * 2))
+                pygame.draw.rect(screen, BLACK, pause_rect.inflate(border_size, border_size))
+                
+                screen.blit(pause_text, pause_rect)
+                
+                # Instructions
+                instruction_text = text_cache.render(small_font, "Press SPACE to continue", True, WHITE)
+                instruction_rect = instruction_text.get_rect(center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2 + 50))
+                screen.blit(instruction_text, instruction_rect)
+                
+            # Emergency vehicle counter in top-left
+            emergency_count = len([v for v in vehicles if v.vehicle_type in [VehicleType.AMBULANCE, VehicleType.POLICE]])
+            if emergency_count > 0:
+                emergency_text = text_cache.render(font, f"🚨 Emergency Vehicles: {emergency_count}", True, EMERGENCY_RED)
+                pygame.draw.rect(screen, BLACK, (10, 80, emergency_text.get_width() + 20, 40))
+                pygame.draw.rect(screen, EMERGENCY_RED, (10, 80, emergency_text.get_width() + 20, 40), 3)
+                screen.blit(emergency_text, (20, 90))
+                
+            if tracker:
+                # Record what changed this frame and push only those areas
+                for light in traffic_lights:
+                    tracker.track(light, light.get_rect(), light.get_draw_state())
+                for vehicle in vehicles:
+                    tracker.track(vehicle, vehicle.get_rect(), vehicle.get_draw_state())
+                if emergency_active:
+                    for i, rect in enumerate(emergency_system.get_alert_rects()):
+                        tracker.track(("alert", i), rect, pygame.time.get_ticks())
+                tracker.track("panel", (0, SCREEN_HEIGHT - ui_panel_height, SCREEN_WIDTH, ui_panel_height),
+                              (tuple(info_texts), info_flash))
+                tracker.add(pygame.Rect(minimap_x, minimap_y - 25, minimap_size, minimap_size + 25).inflate(6, 6))
+                tracker.track("fps", fps_text.get_rect(topleft=(SCREEN_WIDTH - 100, 10)), int(clock.get_fps()))
+                if emergency_count > 0:
+                    tracker.track("emergency_count", (10, 80, emergency_text.get_width() + 20, 40), emergency_count)
+                pygame.display.update(tracker.flush())
             else:
-                color = YELLOW
-            pygame.draw.circle(screen, color, (mini_x, mini_y), 3)
-            
-        # Performance indicator
-        fps_text = small_font.render(f"FPS: {int(clock.get_fps())}", True, WHITE)
-        screen.blit(fps_text, (SCREEN_WIDTH - 100, 10))
-        
-        # Draw pause overlay
-        if paused:
-            # Semi-transparent overlay
-            pause_overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-            pause_overlay.set_alpha(128)
-            pause_overlay.fill(BLACK)
-            screen.blit(pause_overlay, (0, 0))
-            
-            # Pause text with pixelated border
-            pause_text = font.render("GAME PAUSED", True, YELLOW)
-            pause_rect = pause_text.get_rect(center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2))
-            
-            # Draw pixelated border
-            border_size = 10
-            pygame.draw.rect(screen, WHITE, pause_rect.inflate(border_size * 2, border_size * 2))
-            pygame.draw.rect(screen, BLACK, pause_rect.inflate(border_size, border_size))
-            
-            screen.blit(pause_text, pause_rect)
-            
-            # Instructions
-            instruction_text = small_font.render("Press SPACE to continue", True, WHITE)
-            instruction_rect = instruction_text.get_rect(center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2 + 50))
-            screen.blit(instruction_text, instruction_rect)
-            
-        # Emergency vehicle counter in top-left
-        emergency_count = len([v for v in vehicles if v.vehicle_type in [VehicleType.AMBULANCE, VehicleType.POLICE]])
-        if emergency_count > 0:
-            emergency_text = font.render(f"🚨 Emergency Vehicles: {emergency_count}", True, EMERGENCY_RED)
-            pygame.draw.rect(screen, BLACK, (10, 80, emergency_text.get_width() + 20, 40))
-            pygame.draw.rect(screen, EMERGENCY_RED, (10, 80, emergency_text.get_width() + 20, 40), 3)
-            screen.blit(emergency_text, (20, 90))
-            
-        pygame.display.flip()
-        clock.tick(FPS)
-        
+                pygame.display.flip()
+            clock.tick(FPS)
+    finally:
+        if record_path and not replay:
+            sim.event_log.close(sim.frame)
+            
+    if record_path and not replay:
+        print(f"Recorded {sim.frame} frames to: {record_path}")
+    if replay:
+        # Closing the window early leaves part of the log unchecked
+        replay.check_complete()
+        print("Replay matched the log" if replay.mismatch is None
+              else f"Replay diverged: {replay.mismatch}")
     pygame.quit()
     sys.exit()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Pixelated ambulance traffic simulation")
+    parser.add_argument("--headless", action="store_true",
+                        help="run on a simulated clock with no display, as fast as possible")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for vehicle spawns")
+    parser.add_argument("--duration", type=float, default=3600,
+                        help="simulated seconds to run in headless mode")
+    parser.add_argument("--spawn-interval", type=int, default=3000,
+                        help="milliseconds between regular vehicle spawns")
+    parser.add_argument("--emergency-interval", type=int, default=None,
+                        help="milliseconds between emergency vehicle spawns (headless has no keyboard)")
+    parser.add_argument("--backend", choices=["objects", "numpy"], default="objects",
+                        help="headless vehicle backend: Vehicle objects or a vectorized NumPy fleet")
+    parser.add_argument("--dirty-rects", action="store_true",
+                        help="push only changed screen areas instead of full-frame flips (for remote displays)")
+    parser.add_argument("--record", metavar="PATH", help="write a replayable event log of the run")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="re-execute a recorded event log (headless with --headless)")
+    args = parser.parse_args()
+    
+    if args.replay and args.headless:
+        stats, mismatch = replay_headless(args.replay)
+        for key, value in stats.items():
+            print(f"{key}: {value}")
+        if mismatch is None:
+            print("Replay matched the log")
+        else:
+            print(f"Replay diverged: {mismatch}")
+            sys.exit(1)
+    elif args.headless:
+        start = time.perf_counter()
+        stats = run_headless(args.duration, seed=args.seed,
+                             regular_spawn_interval=args.spawn_interval,
+                             emergency_spawn_interval=args.emergency_interval,
+                             fleet_backend=args.backend, record_path=args.record)
+        elapsed = time.perf_counter() - start
+        for key, value in stats.items():
+            print(f"{key}: {value}")
+        print(f"wall_time_s: {elapsed:.2f} ({stats['sim_time_s'] / max(elapsed, 1e-9):.0f}x real time)")
+    else:
+        main(dirty_rects=args.dirty_rects, seed=args.seed,
+             record_path=args.record, replay_path=args.replay)
\ No newline at end of file
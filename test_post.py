@@ -1,6 +1,7 @@
-import requests, time, random
+import requests, time, random, argparse, multiprocessing
 
-while True:
+
+def make_payload(intersection=None):
     payload = {
         "time": int(time.time()),
         "lane_data": {
@@ -9,6 +10,69 @@ while True:
         },
         "emergency_detected": random.choice([False, False, False, True])  # rare emergency
     }
-    res = requests.post("http://127.0.0.1:5000/update", json=payload)
-    print("Sent:", payload)
-    time.sleep(3)
+    if intersection is not None:
+        payload["intersection"] = intersection
+    return payload
+
+
+def sender(args, sent, stop):
+    # Processes rather than threads so a fast load isn't capped by one interpreter;
+    # each keeps one session alive and sends its share of the target rate
+    session = requests.Session()
+    interval = args.workers * args.batch / args.rate
+    next_send = time.perf_counter()
+    while not stop.is_set():
+        payloads = []
+        for _ in range(args.batch):
+            intersection = None
+            if args.intersections > 1:
+                intersection = f"int_{random.randrange(args.intersections)}"
+            payloads.append(make_payload(intersection))
+        session.post(args.url, json=payloads if args.batch > 1 else payloads[0])
+        with sent.get_lock():
+            sent.value += len(payloads)
+        if args.verbose:
+            for payload in payloads:
+                print("Sent:", payload)
+        next_send += interval
+        delay = next_send - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_send = time.perf_counter()  # can't keep up; don't try to burst back
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send fake lane updates to traffic_server.py")
+    parser.add_argument("--url", default="http://127.0.0.1:5000/update")
+    parser.add_argument("--rate", type=float, default=1 / 3, help="updates per second across all workers")
+    parser.add_argument("--workers", type=int, default=1, help="sending processes")
+    parser.add_argument("--batch", type=int, default=1, help="payloads per request")
+    parser.add_argument("--intersections", type=int, default=1,
+                        help="spread updates over this many intersection ids")
+    parser.add_argument("--duration", type=float, default=None, help="seconds to run (default: forever)")
+    parser.add_argument("--quiet", dest="verbose", action="store_false", help="don't print every payload")
+    args = parser.parse_args()
+
+    sent = multiprocessing.Value("q", 0)
+    stop = multiprocessing.Event()
+    workers = [multiprocessing.Process(target=sender, args=(args, sent, stop), daemon=True)
+               for _ in range(args.workers)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    try:
+        while args.duration is None or time.perf_counter() - start < args.duration:
+            time.sleep(1 if args.duration is None else min(1, args.duration))
+            if not args.verbose:
+                elapsed = time.perf_counter() - start
+                print(f"{sent.value} updates in {elapsed:.1f}s ({sent.value / elapsed:.0f}/s)")
+    except KeyboardInterrupt:
+        pass
+    stop.set()
+    for worker in workers:
+        worker.join()
+
+
+if __name__ == "__main__":
+    main()
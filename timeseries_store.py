@@ -0,0 +1,170 @@
+"""In-process time-series store for per-lane count and speed
+
+Every lane keeps one fixed-size NumPy ring buffer per rollup resolution (1 s,
+1 min, 15 min by default) holding min / sum / max of count and speed for each
+bucket. Samples only touch the open 1 s bucket; when a bucket closes it is
+written to its ring and folded into the open bucket of the next resolution, so
+coarser rollups cost nothing per sample. History queries read whichever rollup
+covers the window in at most MAX_POINTS buckets, never raw samples.
+"""
+import numpy as np
+
+FIELDS = ("count", "speed")
+# (bucket seconds, buckets kept): 1 h of seconds, 24 h of minutes, 7 days of quarter hours
+ROLLUPS = ((1, 3600), (60, 24 * 60), (900, 7 * 24 * 4))
+MAX_POINTS = 1500  # most buckets a history query returns
+
+
+class Rollup:
+    """Ring of closed buckets at one resolution, plus the open bucket being filled"""
+
+    def __init__(self, resolution, capacity, coarser=None):
+        self.resolution = resolution
+        self.capacity = capacity
+        self.coarser = coarser
+        self.bucket_ids = np.zeros(capacity, dtype=np.int64)  # bucket start // resolution
+        self.filled = np.zeros(capacity, dtype=bool)  # any id is valid, so empty slots are flagged here
+        self.n = np.zeros(capacity, dtype=np.int32)
+        self.sums = np.zeros((capacity, len(FIELDS)), dtype=np.float32)
+        self.mins = np.zeros((capacity, len(FIELDS)), dtype=np.float32)
+        self.maxs = np.zeros((capacity, len(FIELDS)), dtype=np.float32)
+        self.open_id = None
+        self.open = None  # [n, sums, mins, maxs] as plain Python values, cheap to update
+
+    def add(self, t, n, sums, mins, maxs):
+        bucket = int(t // self.resolution)
+        if bucket != self.open_id:
+            if self.open_id is not None:
+                if bucket < self.open_id:
+                    # Late sample: fold it into the open bucket rather than reopen a closed one
+                    bucket = self.open_id
+                else:
+                    self.close()
+            if bucket != self.open_id:
+                self.open_id = bucket
+                self.open = [0, [0.0] * len(FIELDS), list(mins), list(maxs)]
+        self.open = merge(self.open, n, sums, mins, maxs)
+
+    def close(self):
+        n, sums, mins, maxs = self.open
+        slot = self.open_id % self.capacity
+        self.bucket_ids[slot] = self.open_id
+        self.filled[slot] = True
+        self.n[slot] = n
+        self.sums[slot] = sums
+        self.mins[slot] = mins
+        self.maxs[slot] = maxs
+        if self.coarser is not None:
+            self.coarser.add(self.open_id * self.resolution, n, sums, mins, maxs)
+
+    def pending(self):
+        """The open bucket including what finer rollups haven't handed up yet, or None"""
+        if self.open_id is None:
+            return None
+        n, sums, mins, maxs = self.open
+        return self.open_id, n, sums, mins, maxs
+
+
+def merge(aggregate, n, sums, mins, maxs):
+    total, total_sums, total_mins, total_maxs = aggregate
+    return [total + n,
+            [a + b for a, b in zip(total_sums, sums)],
+            [min(a, b) for a, b in zip(total_mins, mins)],
+            [max(a, b) for a, b in zip(total_maxs, maxs)]]
+
+
+class LaneSeries:
+    def __init__(self, rollups=ROLLUPS):
+        coarser = None
+        levels = []
+        for resolution, capacity in reversed(rollups):
+            coarser = Rollup(resolution, capacity, coarser)
+            levels.append(coarser)
+        self.levels = levels[::-1]  # finest first
+        self.last_time = None
+
+    def add(self, t, values):
+        self.levels[0].add(t, 1, values, values, values)
+        self.last_time = t if self.last_time is None else max(self.last_time, t)
+
+    def open_buckets(self, index):
+        """Data not yet in levels[index]'s ring, as sorted (bucket id, aggregate) at its resolution.
+
+        That is its own open bucket plus the open buckets of every finer level, which may
+        already belong to the next bucket up."""
+        resolution = self.levels[index].resolution
+        buckets = {}
+        for level in self.levels[:index + 1]:
+            pending = level.pending()
+            if pending is None:
+                continue
+            bucket = pending[0] * level.resolution // resolution
+            buckets[bucket] = merge(buckets[bucket], *pending[1:]) if bucket in buckets else list(pending[1:])
+        return sorted(buckets.items())
+
+
+class TimeSeriesStore:
+    """Rollups per lane key; callers serialize access (traffic_server.py runs on one event loop)"""
+
+    def __init__(self, rollups=ROLLUPS, max_points=MAX_POINTS):
+        self.rollups = rollups
+        self.max_points = max_points
+        self.lanes = {}
+
+    def add(self, lane, t, count, speed):
+        series = self.lanes.get(lane)
+        if series is None:
+            series = self.lanes[lane] = LaneSeries(self.rollups)
+        series.add(t, (float(count), float(speed)))
+
+    def pick_level(self, seconds):
+        """Finest rollup that keeps the whole window and answers it in at most max_points buckets"""
+        for index, (resolution, capacity) in enumerate(self.rollups):
+            if seconds <= resolution * capacity and seconds / resolution <= self.max_points:
+                return index
+        return len(self.rollups) - 1
+
+    def history(self, lane, hours, now=None):
+        """Buckets covering the last `hours` for a lane, oldest first, or None for an unknown lane.
+
+        Returns {"resolution_s", "time": bucket start times, "count"/"speed": {"min", "mean", "max"}}.
+        `now` defaults to the lane's newest sample, so a quiet lane still shows its last data.
+        """
+        series = self.lanes.get(lane)
+        if series is None:
+            return None
+        seconds = hours * 3600
+        index = self.pick_level(seconds)
+        level = series.levels[index]
+        now = series.last_time if now is None else now
+        last = int(now // level.resolution)
+        first = max(last - int(seconds // level.resolution) + 1, last - level.capacity + 1)
+
+        # Filled slots whose bucket id is in the window; older cycles of the ring fall outside it
+        ids = level.bucket_ids
+        selected = np.flatnonzero(level.filled & (ids >= first) & (ids <= last))
+        selected = selected[np.argsort(ids[selected])]
+        bucket_ids = ids[selected]
+        n = level.n[selected].astype(np.float64)
+        sums = level.sums[selected].astype(np.float64)
+        mins = level.mins[selected].astype(np.float64)
+        maxs = level.maxs[selected].astype(np.float64)
+
+        pending = [(bucket, aggregate) for bucket, aggregate in series.open_buckets(index)
+                   if first <= bucket <= last]
+        if pending:
+            bucket_ids = np.append(bucket_ids, [bucket for bucket, _ in pending])
+            n = np.append(n, [aggregate[0] for _, aggregate in pending])
+            sums = np.vstack([sums] + [aggregate[1] for _, aggregate in pending])
+            mins = np.vstack([mins] + [aggregate[2] for _, aggregate in pending])
+            maxs = np.vstack([maxs] + [aggregate[3] for _, aggregate in pending])
+
+        means = sums / np.maximum(n, 1)[:, None]
+        result = {"resolution_s": level.resolution, "time": (bucket_ids * level.resolution).tolist()}
+        for column, field in enumerate(FIELDS):
+            result[field] = {
+                "min": np.round(mins[:, column], 2).tolist(),
+                "mean": np.round(means[:, column], 2).tolist(),
+                "max": np.round(maxs[:, column], 2).tolist(),
+            }
+        return result
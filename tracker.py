@@ -0,0 +1,156 @@
+"""Lightweight SORT-style multi-object tracker for app.py
+
+Each track is a constant-velocity Kalman filter over the box centre and
+size. Detections are matched to predicted boxes greedily by IoU, so
+between detector runs the tracks can be carried forward with predict()
+alone. All tracks are filtered together as stacked NumPy arrays.
+"""
+import numpy as np
+
+# State is [cx, cy, w, h, vx, vy, vw, vh]; one step is one tracker tick
+_F = np.eye(8)
+_F[:4, 4:] = np.eye(4)
+_H = np.eye(4, 8)
+_Q = np.diag([1.0, 1.0, 1.0, 1.0, 0.5, 0.5, 0.1, 0.1])
+_R = np.diag([4.0, 4.0, 16.0, 16.0])
+_INITIAL_COV = np.diag([10.0, 10.0, 10.0, 10.0, 100.0, 100.0, 10.0, 10.0])
+
+
+def xyxy_to_state(boxes):
+    boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+    w = boxes[:, 2] - boxes[:, 0]
+    h = boxes[:, 3] - boxes[:, 1]
+    return np.column_stack([boxes[:, 0] + w / 2, boxes[:, 1] + h / 2, w, h])
+
+
+def state_to_xyxy(state):
+    cx, cy = state[:, 0], state[:, 1]
+    w, h = np.maximum(state[:, 2], 1), np.maximum(state[:, 3], 1)
+    return np.column_stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2])
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU between two (N, 4) and (M, 4) xyxy arrays"""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def greedy_match(iou, threshold):
+    """Pair rows with columns by descending IoU; returns (rows, cols) index arrays"""
+    rows, cols = np.nonzero(iou >= threshold)
+    order = np.argsort(-iou[rows, cols], kind="stable")
+    used_rows, used_cols = set(), set()
+    matches = []
+    for r, c in zip(rows[order], cols[order]):
+        if r not in used_rows and c not in used_cols:
+            used_rows.add(r)
+            used_cols.add(c)
+            matches.append((r, c))
+    matches = np.array(matches, dtype=int).reshape(-1, 2)
+    return matches[:, 0], matches[:, 1]
+
+
+class Tracker:
+    """Tracks one camera's vehicles across frames
+    
+    Call predict() once per frame and update() on frames the detector ran.
+    A track is confirmed after `min_hits` matched detections and dropped
+    after `max_misses` detector runs in a row without a match.
+    """
+    def __init__(self, iou_threshold=0.3, min_hits=2, max_misses=3, queue_speed=0.5):
+        self.iou_threshold = iou_threshold
+        self.min_hits = min_hits
+        self.max_misses = max_misses
+        self.queue_speed = queue_speed
+        self.mean = np.zeros((0, 8))
+        self.cov = np.zeros((0, 8, 8))
+        self.ids = np.zeros(0, dtype=int)
+        self.hits = np.zeros(0, dtype=int)
+        self.misses = np.zeros(0, dtype=int)
+        self.labels = []
+        self.next_id = 1
+        self.unique_count = 0  # confirmed tracks ever seen
+        
+    def __len__(self):
+        return len(self.ids)
+        
+    def predict(self):
+        if len(self):
+            self.mean = self.mean @ _F.T
+            self.cov = _F @ self.cov @ _F.T + _Q
+            
+    def update(self, boxes, labels):
+        """Match one detector run's (N, 4) xyxy boxes and their labels to the tracks"""
+        detections = xyxy_to_state(boxes)
+        rows, cols = greedy_match(iou_matrix(self.boxes(), state_to_xyxy(detections)),
+                                  self.iou_threshold)
+        
+        # Kalman correction for matched tracks, all at once
+        if len(rows):
+            cov = self.cov[rows]
+            innovation = detections[cols] - self.mean[rows] @ _H.T
+            s = _H @ cov @ _H.T + _R
+            gain = np.linalg.solve(s, (cov @ _H.T).transpose(0, 2, 1)).transpose(0, 2, 1)
+            self.mean[rows] += (gain @ innovation[:, :, None])[:, :, 0]
+            self.cov[rows] = (np.eye(8) - gain @ _H) @ cov
+            
+        matched = np.zeros(len(self), dtype=bool)
+        matched[rows] = True
+        was_confirmed = self.hits >= self.min_hits
+        self.hits[matched] += 1
+        self.misses[matched] = 0
+        self.misses[~matched] += 1
+        for r, c in zip(rows, cols):
+            self.labels[r] = labels[c]
+        self.unique_count += int(np.count_nonzero((self.hits >= self.min_hits) & ~was_confirmed))
+        
+        keep = self.misses <= self.max_misses
+        self.mean, self.cov = self.mean[keep], self.cov[keep]
+        self.ids, self.hits, self.misses = self.ids[keep], self.hits[keep], self.misses[keep]
+        self.labels = [label for label, k in zip(self.labels, keep) if k]
+        
+        # Unmatched detections start new tracks
+        new = np.ones(len(detections), dtype=bool)
+        new[cols] = False
+        count = int(np.count_nonzero(new))
+        if count:
+            mean = np.zeros((count, 8))
+            mean[:, :4] = detections[new]
+            self.mean = np.concatenate([self.mean, mean])
+            self.cov = np.concatenate([self.cov, np.repeat(_INITIAL_COV[None], count, axis=0)])
+            self.ids = np.concatenate([self.ids, np.arange(self.next_id, self.next_id + count)])
+            self.hits = np.concatenate([self.hits, np.ones(count, dtype=int)])
+            self.misses = np.concatenate([self.misses, np.zeros(count, dtype=int)])
+            self.labels.extend(label for label, n in zip(labels, new) if n)
+            self.next_id += count
+            if self.min_hits <= 1:
+                self.unique_count += count
+                
+    def freeze(self):
+        """Zero every track's velocity, for a scene known to be still"""
+        self.mean[:, 4:] = 0
+        
+    def boxes(self):
+        return state_to_xyxy(self.mean)
+        
+    def confirmed(self):
+        return self.hits >= self.min_hits
+        
+    def tentative(self):
+        """True while some track still needs more matched detections to be confirmed"""
+        return bool(np.any(self.hits < self.min_hits))
+        
+    def active_count(self):
+        """Vehicles currently in view"""
+        return int(np.count_nonzero(self.confirmed()))
+        
+    def queue_length(self):
+        """Confirmed vehicles moving slower than queue_speed pixels per frame"""
+        speed = np.hypot(self.mean[:, 4], self.mean[:, 5])
+        return int(np.count_nonzero(self.confirmed() & (speed < self.queue_speed)))
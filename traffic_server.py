@@ -0,0 +1,450 @@
+"""Traffic data HTTP service for the dashboards
+
+POST /update takes the payloads test_post.py sends (lane_data, emergency_detected,
+optionally an intersection id and signal state) and keeps only the latest state
+per intersection. GET /traffic (TrafficDashboard.jsx) and GET /traffic_data
+(App.jsx) are answered from JSON bytes serialized at most once per state change,
+so reads never re-encode while nothing has changed.
+
+GET /traffic/stream and /traffic_data/stream push the same views as server-sent
+events: a full "snapshot" first, then "update" events holding only the fields
+(and, for /traffic, the lanes) that changed since that subscriber's last event.
+Bursts of updates coalesce into one event per PUSH_INTERVAL_S, subscribers in
+step share one encoded diff, and a client that can't take a write within
+SLOW_CLIENT_TIMEOUT_S is dropped rather than buffered for.
+
+app.py POSTs each lane's annotated frame, already JPEG-encoded, to /frames/{lane}.
+GET /video_feed/{lane} (and /video_feed, for the first lane or ?lane=) is an MJPEG
+stream that writes those same bytes to every viewer; a viewer that falls behind
+skips straight to the newest frame instead of queueing old ones.
+
+Every update also feeds timeseries_store.py, stamped with the time the server
+received it; GET /history?lane=&hours= answers trend charts from its rollups.
+"""
+import json
+import math
+import time
+import asyncio
+import argparse
+
+from aiohttp import web
+
+from timeseries_store import TimeSeriesStore
+
+DEFAULT_INTERSECTION = "default"
+DEFAULT_DIRECTIONS = ("North", "South")
+
+PUSH_INTERVAL_S = 0.1        # at most one event per subscriber per interval
+SLOW_CLIENT_TIMEOUT_S = 5.0  # drop subscribers whose socket stays full this long
+KEEPALIVE_S = 15.0           # comment line so proxies don't close idle streams
+MJPEG_BOUNDARY = "frame"
+
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type",
+}
+
+
+def lane_direction(lane_id):
+    """'north_0' -> 'North'"""
+    return lane_id.split("_", 1)[0].capitalize()
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def validate_payload(payload):
+    """Raise ValueError unless `payload` is a well-formed update; nothing is stored before this passes"""
+    if not isinstance(payload, dict):
+        raise ValueError("payload must be an object or a list of objects")
+    lane_data = payload.get("lane_data")
+    if lane_data is not None:
+        if not isinstance(lane_data, dict):
+            raise ValueError("lane_data must be an object of lane id -> lane object")
+        for lane_id, data in lane_data.items():
+            if not isinstance(data, dict):
+                raise ValueError(f"lane_data[{lane_id!r}] must be an object")
+            for key in ("count", "speed"):
+                if key in data and not is_number(data[key]):
+                    raise ValueError(f"lane_data[{lane_id!r}].{key} must be a number")
+            if "emergency" in data and not isinstance(data["emergency"], bool):
+                raise ValueError(f"lane_data[{lane_id!r}].emergency must be true or false")
+    if "emergency_detected" in payload and not isinstance(payload["emergency_detected"], bool):
+        raise ValueError("emergency_detected must be true or false")
+    for key in ("time", "timer"):
+        if key in payload and not is_number(payload[key]):
+            raise ValueError(f"{key} must be a number")
+    for key in ("green_lane", "phase", "signal"):
+        if key in payload and not isinstance(payload[key], str):
+            raise ValueError(f"{key} must be a string")
+    if "intersection" in payload and not isinstance(payload["intersection"], (str, int)):
+        raise ValueError("intersection must be a string")
+
+
+def view_diff(old, new):
+    """Fields of `new` that differ from `old`; nested dicts (lanes) diff per key"""
+    diff = {}
+    for key, value in new.items():
+        previous = old.get(key)
+        if isinstance(value, dict) and isinstance(previous, dict):
+            changed = {k: v for k, v in value.items() if previous.get(k) != v}
+            if changed:
+                diff[key] = changed
+        elif previous != value or key not in old:
+            diff[key] = value
+    return diff
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: ".encode() + data + b"\n\n"
+
+
+class IntersectionState:
+    def __init__(self, name):
+        self.name = name
+        self.lanes = {}  # lane id -> {"count", "speed", "emergency"}
+        self.emergency = False
+        self.time = None
+        self.signal = {}  # optional green_lane / phase / timer / signal from the sender
+        self.version = 0
+        self._cache = {}  # view name -> (version, dict, bytes)
+        self._diff_cache = {}  # (view, from version) -> (to version, bytes)
+        self.subscribers = set()  # asyncio.Events of the streams watching this intersection
+
+    def apply(self, payload):
+        for lane_id, data in (payload.get("lane_data") or {}).items():
+            lane = self.lanes.setdefault(lane_id, {"count": 0, "speed": 0.0, "emergency": False})
+            for key in ("count", "speed", "emergency"):
+                if key in data:
+                    lane[key] = data[key]
+        if "emergency_detected" in payload:
+            self.emergency = bool(payload["emergency_detected"])
+        if "time" in payload:
+            self.time = payload["time"]
+        for key in ("green_lane", "phase", "timer", "signal"):
+            if key in payload:
+                self.signal[key] = payload[key]
+        self.version += 1
+        for wake in self.subscribers:
+            wake.set()
+
+    def direction_totals(self):
+        totals = dict.fromkeys(DEFAULT_DIRECTIONS, 0)
+        emergencies = dict.fromkeys(DEFAULT_DIRECTIONS, False)
+        for lane_id, lane in self.lanes.items():
+            direction = lane_direction(lane_id)
+            totals[direction] = totals.get(direction, 0) + lane["count"]
+            emergencies[direction] = emergencies.get(direction, False) or bool(lane["emergency"])
+        # Senders that only report an intersection-wide flag light up every approach
+        if self.emergency and not any(emergencies.values()):
+            emergencies = dict.fromkeys(emergencies, True)
+        return totals, emergencies
+
+    def green_lane(self, totals):
+        if "green_lane" in self.signal:
+            return self.signal["green_lane"]
+        # No controller state reported: assume the busiest approach is being served
+        return max(totals, key=totals.get) if any(totals.values()) else ""
+
+    def traffic(self):
+        """Shape polled by TrafficDashboard.jsx: {lanes, signal}"""
+        totals, _ = self.direction_totals()
+        signal = self.signal.get("signal")
+        if signal is None:
+            green_lane = self.green_lane(totals)
+            signal = f"{green_lane} {self.signal.get('phase', 'green').capitalize()}" if green_lane else "Waiting for data"
+        if self.emergency:
+            signal = f"{signal} (Emergency)"
+        return {
+            "lanes": {lane_id: lane["count"] for lane_id, lane in self.lanes.items()},
+            "signal": signal,
+            "emergency": self.emergency,
+            "time": self.time,
+        }
+
+    def traffic_data(self):
+        """Flat shape polled by App.jsx"""
+        totals, emergencies = self.direction_totals()
+        data = {
+            "green_lane": self.green_lane(totals),
+            "phase": self.signal.get("phase", "green"),
+            "timer": self.signal.get("timer", 0),
+            "time": self.time,
+        }
+        for direction, count in totals.items():
+            data[f"{direction.lower()}_count"] = count
+            data[f"{direction.lower()}_emergency"] = emergencies[direction]
+        return data
+
+    def snapshot(self, view):
+        """(version, dict, JSON bytes) of a view, built at most once per version"""
+        cached = self._cache.get(view)
+        if cached is None or cached[0] != self.version:
+            data = getattr(self, view)()
+            cached = (self.version, data, json.dumps(data).encode())
+            self._cache[view] = cached
+        return cached
+
+    def serialized(self, view):
+        return self.snapshot(view)[2]
+
+    def diff_bytes(self, view, old_version, old_data):
+        """Encoded diff from a subscriber's last snapshot to the current one, or None if
+        nothing visible changed. Subscribers that last saw the same version share it."""
+        version, data, _ = self.snapshot(view)
+        cached = self._diff_cache.get((view, old_version))
+        if cached is None or cached[0] != version:
+            if len(self._diff_cache) > 64:
+                self._diff_cache = {key: value for key, value in self._diff_cache.items()
+                                    if value[0] == version}
+            diff = view_diff(old_data, data)
+            cached = (version, json.dumps(diff).encode() if diff else None)
+            self._diff_cache[(view, old_version)] = cached
+        return cached[1]
+
+
+class TrafficStore:
+    """Latest state per intersection; everything runs on the event loop thread, so no locks"""
+
+    def __init__(self):
+        self.intersections = {}
+        self.updates = 0
+        self.dropped_subscribers = 0
+        self.history = TimeSeriesStore()  # keyed by (intersection, lane id)
+
+    def get(self, name):
+        state = self.intersections.get(name)
+        if state is None:
+            state = self.intersections[name] = IntersectionState(name)
+        return state
+
+    def apply(self, payload):
+        state = self.get(str(payload.get("intersection", DEFAULT_INTERSECTION)))
+        state.apply(payload)
+        self.updates += 1
+        # History uses our own clock: one sender with a skewed clock, or sending milliseconds,
+        # would otherwise open a bucket far in the future and swallow every later sample
+        t = time.time()
+        for lane_id in payload.get("lane_data") or {}:
+            lane = state.lanes[lane_id]
+            self.history.add((state.name, lane_id), t, lane["count"], lane["speed"])
+        return state
+
+
+class FrameChannel:
+    """Newest encoded frame of one lane, framed once as a multipart part for all viewers"""
+
+    def __init__(self):
+        self.part = None
+        self.sequence = 0
+        self.new_frame = asyncio.Event()
+        self.viewers = 0
+
+    def publish(self, jpeg):
+        self.part = (f"--{MJPEG_BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                     f"Content-Length: {len(jpeg)}\r\n\r\n").encode() + jpeg + b"\r\n"
+        self.sequence += 1
+        # Wake everyone waiting on this frame; later waiters get a fresh event
+        self.new_frame.set()
+        self.new_frame = asyncio.Event()
+
+
+class FrameHub:
+    def __init__(self):
+        self.channels = {}  # lane name -> FrameChannel, created only by app.py sending frames
+        self.first_frame = asyncio.Event()
+        self.dropped_viewers = 0
+
+    def publish(self, lane, jpeg):
+        channel = self.channels.get(lane)
+        if channel is None:
+            channel = self.channels[lane] = FrameChannel()
+        channel.publish(jpeg)
+        self.first_frame.set()
+
+
+def json_bytes_response(body):
+    return web.Response(body=body, content_type="application/json", headers=CORS_HEADERS)
+
+
+async def handle_update(request):
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text="body must be JSON", headers=CORS_HEADERS)
+    # Senders may batch several payloads into one request
+    payloads = payload if isinstance(payload, list) else [payload]
+    # Validate the whole batch first so a bad payload can't leave state half-applied
+    try:
+        for p in payloads:
+            validate_payload(p)
+    except ValueError as e:
+        raise web.HTTPBadRequest(text=str(e), headers=CORS_HEADERS)
+    store = request.app["store"]
+    for p in payloads:
+        store.apply(p)
+    return web.Response(status=204, headers=CORS_HEADERS)
+
+
+def requested_state(request):
+    name = request.query.get("intersection", DEFAULT_INTERSECTION)
+    state = request.app["store"].intersections.get(name)
+    if state is None:
+        if name != DEFAULT_INTERSECTION:
+            raise web.HTTPNotFound(text=f"unknown intersection {name!r}", headers=CORS_HEADERS)
+        state = request.app["store"].get(name)
+    return state
+
+
+def read_handler(view):
+    async def handle(request):
+        return json_bytes_response(requested_state(request).serialized(view))
+    return handle
+
+
+def stream_handler(view):
+    async def handle(request):
+        state = requested_state(request)
+        response = web.StreamResponse(headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            **CORS_HEADERS,
+        })
+        await response.prepare(request)
+
+        wake = asyncio.Event()
+        state.subscribers.add(wake)
+        try:
+            version, data, body = state.snapshot(view)
+            await asyncio.wait_for(response.write(sse_event("snapshot", body)), SLOW_CLIENT_TIMEOUT_S)
+            while True:
+                try:
+                    await asyncio.wait_for(wake.wait(), KEEPALIVE_S)
+                except asyncio.TimeoutError:
+                    await asyncio.wait_for(response.write(b": keepalive\n\n"), SLOW_CLIENT_TIMEOUT_S)
+                    continue
+                wake.clear()
+                # Everything since the last event collapses into one diff against what
+                # this client last received, so a slow reader never sees a backlog
+                body = state.diff_bytes(view, version, data)
+                version, data, _ = state.snapshot(view)
+                if body is not None:
+                    await asyncio.wait_for(response.write(sse_event("update", body)), SLOW_CLIENT_TIMEOUT_S)
+                await asyncio.sleep(PUSH_INTERVAL_S)
+        except asyncio.TimeoutError:
+            request.app["store"].dropped_subscribers += 1
+        except ConnectionResetError:
+            pass
+        finally:
+            state.subscribers.discard(wake)
+        return response
+    return handle
+
+
+async def handle_frame(request):
+    jpeg = await request.read()
+    if not jpeg.startswith(b"\xff\xd8"):
+        raise web.HTTPBadRequest(text="body must be a JPEG image", headers=CORS_HEADERS)
+    request.app["frames"].publish(request.match_info["lane"], jpeg)
+    return web.Response(status=204, headers=CORS_HEADERS)
+
+
+async def handle_video_feed(request):
+    hub = request.app["frames"]
+    lane = request.match_info.get("lane") or request.query.get("lane")
+    if lane is not None and lane not in hub.channels:
+        raise web.HTTPNotFound(text=f"no frames received for lane {lane!r}", headers=CORS_HEADERS)
+    response = web.StreamResponse(headers={
+        "Content-Type": f"multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}",
+        "Cache-Control": "no-cache",
+        **CORS_HEADERS,
+    })
+    await response.prepare(request)
+
+    if lane is None:
+        # Plain /video_feed shows the first lane app.py sent, once there is one
+        await hub.first_frame.wait()
+        lane = next(iter(hub.channels))
+    channel = hub.channels[lane]
+
+    channel.viewers += 1
+    sequence = 0
+    try:
+        while True:
+            if channel.sequence == sequence:
+                await channel.new_frame.wait()
+            # Always the newest part: frames published while a slow write drained are skipped
+            sequence = channel.sequence
+            await asyncio.wait_for(response.write(channel.part), SLOW_CLIENT_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        hub.dropped_viewers += 1
+    except ConnectionResetError:
+        pass
+    finally:
+        channel.viewers -= 1
+    return response
+
+
+async def handle_history(request):
+    intersection = request.query.get("intersection", DEFAULT_INTERSECTION)
+    lane = request.query.get("lane")
+    try:
+        hours = float(request.query.get("hours", 24))
+    except ValueError:
+        hours = 0
+    if not lane or not 0 < hours < float("inf"):
+        raise web.HTTPBadRequest(text="need ?lane= and a positive ?hours=", headers=CORS_HEADERS)
+    history = request.app["store"].history.history((intersection, lane), hours)
+    if history is None:
+        raise web.HTTPNotFound(text=f"no history for lane {lane!r} at {intersection!r}", headers=CORS_HEADERS)
+    return web.json_response({"intersection": intersection, "lane": lane, "hours": hours, **history},
+                             headers=CORS_HEADERS)
+
+
+async def handle_intersections(request):
+    store = request.app["store"]
+    hub = request.app["frames"]
+    return web.json_response({
+        "intersections": sorted(store.intersections),
+        "updates": store.updates,
+        "subscribers": sum(len(state.subscribers) for state in store.intersections.values()),
+        "dropped_subscribers": store.dropped_subscribers,
+        "video_viewers": {lane: channel.viewers for lane, channel in hub.channels.items()},
+        "dropped_viewers": hub.dropped_viewers,
+    }, headers=CORS_HEADERS)
+
+
+async def handle_options(request):
+    return web.Response(status=204, headers=CORS_HEADERS)
+
+
+def create_app():
+    app = web.Application()
+    app["store"] = TrafficStore()
+    app["frames"] = FrameHub()
+    app.router.add_post("/update", handle_update)
+    app.router.add_get("/traffic", read_handler("traffic"))
+    app.router.add_get("/traffic_data", read_handler("traffic_data"))
+    app.router.add_get("/traffic/stream", stream_handler("traffic"))
+    app.router.add_get("/traffic_data/stream", stream_handler("traffic_data"))
+    app.router.add_post("/frames/{lane}", handle_frame)
+    app.router.add_get("/video_feed", handle_video_feed)
+    app.router.add_get("/video_feed/{lane}", handle_video_feed)
+    app.router.add_get("/history", handle_history)
+    app.router.add_get("/intersections", handle_intersections)
+    app.router.add_route("OPTIONS", "/{tail:.*}", handle_options)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve live traffic data to the dashboards")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+    web.run_app(create_app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()